@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.forms.widgets import Select
 from django.db.models import Q
 from .models import *
+from .services import deferred_recompute
 
 class SupplierItemInline(admin.TabularInline):
     model = SupplierItem
@@ -32,6 +33,11 @@ class ItemAdmin(admin.ModelAdmin):
     list_filter = ('itemCategory',)
     inlines = [IndividualItemInline]
 
+    def delete_queryset(self, request, queryset):
+        #bulk delete action, the categories of the deleted items are recounted once
+        with deferred_recompute():
+            super().delete_queryset(request, queryset)
+
 @admin.register(IndividualItem)
 class IndividualItemAdmin(admin.ModelAdmin):
     list_display = ('itemCode', 'item', 'is_available', 'price')
@@ -39,6 +45,16 @@ class IndividualItemAdmin(admin.ModelAdmin):
     list_filter = ('is_available', 'item')
     readonly_fields = ('itemCode',)
 
+    #availability edited by hand or bulk deletes bypass the allocation paths, so recounting the affected items' stored available_quantity
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Item.reconcile_available_quantity(Item.objects.filter(pk=obj.item_id), fix=True)
+
+    def delete_queryset(self, request, queryset):
+        item_ids = list(queryset.values_list('item', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        Item.reconcile_available_quantity(Item.objects.filter(pk__in=item_ids), fix=True)
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('categoryName', 'categoryQuantity')
@@ -58,6 +74,15 @@ class PurchaseAdmin(admin.ModelAdmin):
     readonly_fields = ('totalPrice', 'finalPriceWithVat')
     inlines = [PurchaseItemInline]
 
+    #a bill saved or deleted with all its lines recounts its totals and categories once instead of once per line
+    def save_related(self, request, form, formsets, change):
+        with deferred_recompute():
+            super().save_related(request, form, formsets, change)
+
+    def delete_queryset(self, request, queryset):
+        with deferred_recompute():
+            super().delete_queryset(request, queryset)
+
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ('projectName', 'projectLeader')
@@ -0,0 +1,133 @@
+import hashlib
+from functools import wraps
+from time import time_ns
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+from inventory_management.utils import stream_requested
+from inventory.notifications import notify
+
+#read-through cache for list responses: every cached list is keyed on the version counters of the models it shows,
+#a write bumps the counter (after commit) so the next read misses and rebuilds, stale entries are never read again and expire
+
+#which version counters a write to a model bumps, by model label
+MODEL_VERSIONS = {
+    'inventory.Item': ('item',),
+    'inventory.Category': ('category',),
+    'inventory.Supplier': ('supplier',),
+    'inventory.SupplierItem': ('supplier',), #nested in the supplier serializer
+    'inventory.Project': ('project',),
+    'inventory.ProjectItem': ('project',), #nested in the project serializer
+    'inventory.Purchase': ('purchase',),
+    'inventory.PurchaseItem': ('purchase',),
+}
+
+def version_key(name):
+    return f"inventory:version:{name}"
+
+def get_versions(names):
+    #one cache round trip for all counters, missing ones (first use, evicted, restarted locmem) start from the current time
+    #so they can never come back to a number older entries were stored under
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+def bump_versions(*names):
+    #bumped once the surrounding transaction commits, bumping earlier would let a concurrent read cache the old rows under the new version
+    if names:
+        transaction.on_commit(lambda: _bump_now(names))
+
+def _bump_now(names):
+    bump_local_versions(names)
+    #a local memory cache only holds this worker's counters, the other workers bump theirs when notified
+    if isinstance(caches['default'], LocMemCache):
+        notify('versions', names)
+
+def bump_local_versions(names):
+    for name in names:
+        try:
+            cache.incr(version_key(name))
+        except ValueError:
+            cache.add(version_key(name), time_ns())
+
+def bump_model_versions(model):
+    bump_versions(*MODEL_VERSIONS.get(model._meta.label, ()))
+
+def record_hit(view_name, hit):
+    #shared counters, hit rates per view are printed by the list_cache_stats command
+    key = f"inventory:stats:{view_name}:{'hit' if hit else 'miss'}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+def cache_stats(view_names):
+    stats = {}
+    for view_name in view_names:
+        hits = cache.get(f"inventory:stats:{view_name}:hit", 0)
+        misses = cache.get(f"inventory:stats:{view_name}:miss", 0)
+        stats[view_name] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None}
+    return stats
+
+def list_etag(view_name, versions, request):
+    #strong etag from the version counters alone, so it is known before any row is read or serialized
+    #the accept header is part of it since the same data is rendered differently for the browsable api
+    source = f"{view_name}:{versions}:{request.get_full_path()}:{request.META.get('HTTP_ACCEPT', '')}"
+    return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+def cached_list(*version_names):
+    #decorator for the list GET of an APIView, caches successful response data per query string and model versions
+    #and answers conditional GETs (If-None-Match) with a 304 when the versions haven't moved since the client's copy
+    #streamed responses are passed through, they are never built in memory
+    def decorator(get):
+        view_name = get.__qualname__.split('.')[0]
+
+        @wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            if stream_requested(request):
+                return get(view, request, *args, **kwargs)
+
+            versions = '.'.join(str(version) for version in get_versions(version_names))
+            etag = list_etag(view_name, versions, request)
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            query = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f"inventory:list:{view_name}:{versions}:{query}"
+
+            data = cache.get(key)
+            if data is not None:
+                record_hit(view_name, True)
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                response['ETag'] = etag
+                return response
+
+            record_hit(view_name, False)
+            response = get(view, request, *args, **kwargs)
+            #api_response keeps the http status at 200 and reports failures in the envelope
+            if response.status_code == 200 and response.data.get('IsSuccess'):
+                cache.set(key, response.data, getattr(settings, 'LIST_CACHE_TIMEOUT', 300))
+                response['ETag'] = etag
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
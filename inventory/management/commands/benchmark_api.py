@@ -0,0 +1,159 @@
+import json
+import random
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment, setup_databases, teardown_databases
+from inventory.models import Category, Item, SupplierItem, Purchase, Project, close_reservation_connection
+from inventory.cache import MODEL_VERSIONS, bump_local_versions
+
+#arguments for generate_inventory_data per dataset size, fixed so runs on different commits are comparable
+DATASET_SIZES = {
+    'small': {'categories': 10, 'items': 200, 'units': 10000, 'suppliers': 10, 'purchases': 200, 'projects': 20},
+    'medium': {'categories': 20, 'items': 1000, 'units': 100000, 'suppliers': 50, 'purchases': 1000, 'projects': 100},
+    'large': {'categories': 50, 'items': 5000, 'units': 1000000, 'suppliers': 200, 'purchases': 10000, 'projects': 1000},
+}
+
+class Command(BaseCommand):
+    help = ("Benchmarks the /api/ routes through the real url configuration against a freshly created test database filled "
+            "with generate_inventory_data, and prints p50/p95/p99 latency, throughput and query counts per scenario as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=DATASET_SIZES, default='small')
+        parser.add_argument('--requests', type=int, default=50, help="Requests per scenario.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Also write the JSON report to this file.")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse (and keep) the test database between runs.")
+
+    #no LISTEN/NOTIFY listener for the harness processes, its startup eviction would show up as cold cache reads
+    @override_settings(INVENTORY_NOTIFY=False)
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            #the signal receivers print progress messages, keeping stdout for the JSON report
+            with redirect_stdout(sys.stderr):
+                #the generator refuses to run twice for a seed, a kept database already has the data
+                if not Purchase.objects.filter(billNo__startswith=f"G{options['seed']}-").exists():
+                    call_command('generate_inventory_data', seed=options['seed'], stdout=self.stderr, **DATASET_SIZES[options['size']])
+                report = self.run_scenarios(options['requests'], random.Random(options['seed']))
+        finally:
+            close_reservation_connection() #an open connection keeps the test database from being dropped
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'database': connection.vendor,
+            'size': options['size'],
+            'requests_per_scenario': options['requests'],
+            'scenarios': report,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def run_scenarios(self, count, rng):
+        self.client = Client()
+        category_id = Category.objects.values_list('pk', flat=True).first()
+        purchase = Purchase.objects.order_by('pk').first()
+        price_list = list(SupplierItem.objects.filter(supplier_id=purchase.supplier_id).values_list('item_id', 'item__itemCategory_id', 'price'))
+        project_id = Project.objects.values_list('pk', flat=True).first()
+        stocked_items = list(Item.objects.filter(available_quantity__gte=count * 5).values_list('pk', flat=True)[:50])
+
+        created_items = []
+        created_project_items = []
+        scenarios = {}
+
+        list_urls = {
+            'list items': '/api/item/',
+            'list items page': '/api/item/?page_size=100',
+            'list categories': '/api/category/',
+            'list individual items page': '/api/individual_item/?page_size=100',
+            'list suppliers page': '/api/supplier/?page_size=100',
+            'list purchases page': '/api/purchase/?page_size=100',
+            'list projects page': '/api/project/?page_size=100',
+            'purchase detail': f'/api/purchase/{purchase.pk}/',
+        }
+        #the list reads are cached (inventory/cache.py): measured as deployed (repeated requests are mostly cache hits) and with
+        #the list cache invalidated before every request, which is the path a read right after a write takes
+        version_names = {name for names in MODEL_VERSIONS.values() for name in names}
+        for name, url in list_urls.items():
+            scenarios[name] = self.measure(count, lambda i, url=url: self.client.get(url))
+            scenarios[f"{name} (cold cache)"] = self.measure(
+                count, lambda i, url=url: self.client.get(url), before=lambda: bump_local_versions(version_names)
+            )
+
+        def create_item(i):
+            response = self.client.post('/api/item/', {'itemName': f"Bench item {i}", 'itemQuantity': 10, 'itemCategory': category_id}, content_type='application/json')
+            if response.json()['IsSuccess']:
+                created_items.append(response.json()['Result']['id'])
+            return response
+        scenarios['create item'] = self.measure(count, create_item)
+
+        def create_purchase_line(i):
+            item_id, item_category_id, price = rng.choice(price_list)
+            return self.client.post(f'/api/purchase/{purchase.pk}/', {
+                'purchase': purchase.pk, 'item': item_id, 'category': item_category_id, 'quantity': 10, 'price': price,
+            }, content_type='application/json')
+        scenarios['create purchase line'] = self.measure(count, create_purchase_line)
+
+        def allocate(i):
+            response = self.client.post(f'/api/project/{project_id}/', {
+                'associated_project': project_id, 'item': rng.choice(stocked_items), 'quantity': 5,
+            }, content_type='application/json')
+            if response.json()['IsSuccess']:
+                created_project_items.append(response.json()['Result']['id'])
+            return response
+        scenarios['allocate project item'] = self.measure(count, allocate) if stocked_items else None
+
+        scenarios['delete project item'] = self.measure(
+            len(created_project_items), lambda i: self.client.delete(f'/api/project/{project_id}/', {'id': created_project_items[i]}, content_type='application/json')
+        )
+        scenarios['delete item'] = self.measure(
+            len(created_items), lambda i: self.client.delete('/api/item/', {'id': created_items[i]}, content_type='application/json')
+        )
+        return scenarios
+
+    def measure(self, count, send, before=None):
+        #before: run ahead of every request, outside of the measured time and queries
+        latencies = []
+        queries = []
+        failures = 0
+        start = perf_counter()
+        for i in range(count):
+            if before:
+                before()
+            with CaptureQueriesContext(connection) as captured:
+                request_start = perf_counter()
+                response = send(i)
+                latencies.append(perf_counter() - request_start)
+            queries.append(len(captured))
+            #views report failures in the envelope, not always in the status code
+            if response.status_code >= 400 or not response.json().get('IsSuccess', False):
+                failures += 1
+        elapsed = perf_counter() - start
+
+        if not latencies:
+            return None
+        latencies.sort()
+        return {
+            'requests': count,
+            'failures': failures,
+            'p50_ms': self.percentile(latencies, 50),
+            'p95_ms': self.percentile(latencies, 95),
+            'p99_ms': self.percentile(latencies, 99),
+            'throughput_rps': round(count / elapsed, 1),
+            'queries_mean': round(sum(queries) / len(queries), 1),
+            'queries_max': max(queries),
+        }
+
+    def percentile(self, ordered, percent):
+        #nearest rank percentile of already sorted latencies, in milliseconds
+        index = max(0, -(-len(ordered) * percent // 100) - 1)
+        return round(ordered[index] * 1000, 2)
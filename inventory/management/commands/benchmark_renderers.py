@@ -0,0 +1,46 @@
+import json
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from inventory.models import IndividualItem
+from inventory.serializers import IndividualItemSerializer
+from inventory_management.renderers import FastJSONRenderer, orjson
+from inventory_management.utils import api_response
+
+class Command(BaseCommand):
+    help = ("Renders an individual item list (in the api_response envelope, like GET /api/individual_item/) with DRF's "
+            "JSONRenderer and with FastJSONRenderer, and prints the best time of each and the speedup as JSON. "
+            "The rows are built in memory, no database is needed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5, help="Renders per renderer, the fastest one is reported.")
+
+    def handle(self, *args, **options):
+        units = [
+            IndividualItem(id=i, item_id=i // 100 + 1, itemCode=f"AB{i:06d}", is_available=i % 3 != 0)
+            for i in range(1, options['rows'] + 1)
+        ]
+        #the same serializer output the view renders: ReturnList of dicts inside the envelope
+        start = perf_counter()
+        data = api_response(is_success=True, status_code=200, result=IndividualItemSerializer(units, many=True).data).data
+        serialization_time = perf_counter() - start
+
+        results = {}
+        outputs = {}
+        for name, renderer in [('JSONRenderer', JSONRenderer()), ('FastJSONRenderer', FastJSONRenderer())]:
+            timings = []
+            for _ in range(options['repeat']):
+                start = perf_counter()
+                outputs[name] = renderer.render(data, 'application/json', {})
+                timings.append(perf_counter() - start)
+            results[name] = {'best_ms': round(min(timings) * 1000, 2), 'bytes': len(outputs[name])}
+
+        self.stdout.write(json.dumps({
+            'rows': options['rows'],
+            'orjson': orjson.__version__ if orjson else None,
+            'serialization_ms': round(serialization_time * 1000, 2),
+            'renderers': results,
+            'speedup': round(results['JSONRenderer']['best_ms'] / results['FastJSONRenderer']['best_ms'], 1),
+            'identical_output': json.loads(outputs['JSONRenderer']) == json.loads(outputs['FastJSONRenderer']),
+        }, indent=2))
@@ -0,0 +1,182 @@
+import random
+from collections import defaultdict
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from inventory.models import (
+    Category, Item, ItemCodeCounter, IndividualItem, Supplier, SupplierItem, Purchase, PurchaseItem, Project, ProjectItem,
+)
+from inventory.services import ProjectItemUnit
+from inventory.cache import MODEL_VERSIONS, bump_versions
+
+class Command(BaseCommand):
+    help = ("Fills the database with synthetic categories, items, individual items, suppliers with price lists, purchases "
+            "and projects with allocated units. Everything is bulk inserted (no per row signals) and the stored totals are "
+            "recomputed at the end, the same seed always produces the same data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, also part of every generated name so runs with different seeds can be stacked.")
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--units', type=int, default=100000, help="Total number of individual items, spread over the items.")
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--items-per-supplier', type=int, default=100, help="Size of every supplier's price list.")
+        parser.add_argument('--purchases', type=int, default=1000)
+        parser.add_argument('--lines-per-purchase', type=int, default=10)
+        parser.add_argument('--projects', type=int, default=100)
+        parser.add_argument('--items-per-project', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT statement.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.tag = f"G{options['seed']}"
+        self.batch_size = options['batch_size']
+
+        if Purchase.objects.filter(billNo__startswith=f"{self.tag}-").exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists, use another --seed.")
+
+        start = perf_counter()
+        with transaction.atomic():
+            categories = self.step('categories', self.create_categories, options['categories'])
+            items = self.step('items', self.create_items, categories, options['items'], options['units'])
+            self.step('individual items', self.create_units, items)
+            price_lists = self.step('suppliers', self.create_suppliers, items, options['suppliers'], options['items_per_supplier'])
+            self.step('purchases', self.create_purchases, price_lists, options['purchases'], options['lines_per_purchase'])
+            self.step('projects', self.create_projects, items, options['projects'], options['items_per_project'])
+            self.step('totals', self.recompute_totals, items, categories)
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {perf_counter() - start:.1f}s"))
+
+    def step(self, name, function, *args):
+        start = perf_counter()
+        result = function(*args)
+        self.stdout.write(f"{name}: {perf_counter() - start:.1f}s")
+        return result
+
+    def create_categories(self, count):
+        return Category.objects.bulk_create(
+            [Category(categoryName=f"Category {self.tag}-{i}") for i in range(count)], batch_size=self.batch_size
+        )
+
+    def create_items(self, categories, count, units):
+        #random two letter names so the units spread over many code prefixes like real item names do
+        letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+        quantities = self.split(units, count)
+        items = [
+            Item(
+                itemName=f"{self.rng.choice(letters)}{self.rng.choice(letters).lower()} part {self.tag}-{i}",
+                itemQuantity=quantities[i],
+                itemCategory=self.rng.choice(categories),
+            )
+            for i in range(count)
+        ]
+        items = Item.objects.bulk_create(items, batch_size=self.batch_size)
+        #base price per item, supplier prices and unit prices vary around it
+        self.base_prices = {item.pk: self.rng.randint(10, 5000) for item in items}
+        return items
+
+    def split(self, total, parts):
+        #`parts` random non negative integers adding up to `total`
+        cuts = sorted(self.rng.randint(0, total) for _ in range(parts - 1))
+        return [high - low for low, high in zip([0] + cuts, cuts + [total])]
+
+    def create_units(self, items):
+        #one counter reservation per prefix for all its items, done before any unit is inserted since creating a counter
+        #looks up the last code already used for its prefix, then the units are streamed to the database in batches
+        items_per_prefix = defaultdict(list)
+        for item in items:
+            items_per_prefix[item.code_prefix].append(item)
+        start_numbers = {
+            prefix: ItemCodeCounter.reserve(prefix, sum(item.itemQuantity for item in prefix_items))
+            for prefix, prefix_items in items_per_prefix.items()
+        }
+
+        batch = []
+        for prefix, prefix_items in items_per_prefix.items():
+            number = start_numbers[prefix]
+            for item in prefix_items:
+                batch.extend(item._build_individual_items(number, item.itemQuantity, self.base_prices[item.pk]))
+                number += item.itemQuantity
+                if len(batch) >= self.batch_size:
+                    IndividualItem.objects.bulk_create(batch, batch_size=self.batch_size)
+                    batch = []
+        IndividualItem.objects.bulk_create(batch, batch_size=self.batch_size)
+
+    def create_suppliers(self, items, count, items_per_supplier):
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(supplierName=f"Supplier {self.tag}-{i}", address=f"Street {i}", contactNo=f"98{self.rng.randint(0, 10 ** 8 - 1):08d}")
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+        price_lists = {}
+        supplier_items = []
+        for supplier in suppliers:
+            sold = self.rng.sample(items, min(items_per_supplier, len(items)))
+            price_lists[supplier.pk] = [(item, max(1, self.base_prices[item.pk] + self.rng.randint(-5, 5))) for item in sold]
+            supplier_items.extend(SupplierItem(supplier=supplier, item=item, price=price) for item, price in price_lists[supplier.pk])
+        SupplierItem.objects.bulk_create(supplier_items, batch_size=self.batch_size)
+        return price_lists
+
+    def create_purchases(self, price_lists, count, lines_per_purchase):
+        supplier_ids = [supplier_id for supplier_id, price_list in price_lists.items() if price_list]
+        if not supplier_ids:
+            return
+        purchases = Purchase.objects.bulk_create([
+            Purchase(billNo=f"{self.tag}-{i}", supplier_id=self.rng.choice(supplier_ids), paymentStatus=self.rng.choice(['Paid', 'Pending']))
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+        #lines follow the supplier's price list and the item's category, like PurchaseItem.clean requires
+        lines = []
+        for purchase in purchases:
+            price_list = price_lists[purchase.supplier_id]
+            for item, price in self.rng.sample(price_list, min(lines_per_purchase, len(price_list))):
+                lines.append(PurchaseItem(
+                    purchase=purchase, item=item, category_id=item.itemCategory_id, quantity=self.rng.randint(1, 50), price=price,
+                ))
+        PurchaseItem.objects.bulk_create(lines, batch_size=self.batch_size)
+        Purchase.reconcile_totals(self.inserted(Purchase, purchases), fix=True)
+
+    def create_projects(self, items, count, items_per_project):
+        projects = Project.objects.bulk_create([
+            Project(projectName=f"Project {self.tag}-{i}", projectLeader=f"Leader {self.rng.randint(1, 50)}")
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+        #units still free per item, oldest codes first like allocate_units picks them
+        stocked = [item for item in items if item.itemQuantity]
+        free_units = {}
+        project_items = []
+        for project in projects:
+            for item in self.rng.sample(stocked, min(items_per_project, len(stocked))):
+                if item.pk not in free_units:
+                    free_units[item.pk] = list(
+                        IndividualItem.objects.filter(item=item, is_available=True).order_by('itemCode').values_list('id', flat=True)
+                    )
+                quantity = min(len(free_units[item.pk]), self.rng.randint(1, 20))
+                if quantity:
+                    project_items.append((ProjectItem(associated_project=project, item=item, quantity=quantity), free_units[item.pk][:quantity]))
+                    del free_units[item.pk][:quantity]
+
+        ProjectItem.objects.bulk_create([project_item for project_item, _ in project_items], batch_size=self.batch_size)
+        links = [
+            ProjectItemUnit(projectitem_id=project_item.pk, individualitem_id=unit_id)
+            for project_item, unit_ids in project_items for unit_id in unit_ids
+        ]
+        ProjectItemUnit.objects.bulk_create(links, batch_size=self.batch_size)
+        allocated = [link.individualitem_id for link in links]
+        for start in range(0, len(allocated), self.batch_size):
+            IndividualItem.objects.filter(pk__in=allocated[start:start + self.batch_size]).update(is_available=False)
+
+    def recompute_totals(self, items, categories):
+        #bulk inserts skip the receivers, the stored counters are set once from the inserted rows
+        Item.reconcile_available_quantity(self.inserted(Item, items), fix=True)
+        Category.reconcile_quantities(self.inserted(Category, categories), fix=True)
+        #bulk inserts don't bump the cached list versions either
+        bump_versions(*{name for names in MODEL_VERSIONS.values() for name in names})
+
+    def inserted(self, model, rows):
+        #primary key range of the inserted rows instead of a huge IN list, reconciling a row inserted in between is harmless
+        if not rows:
+            return model.objects.none()
+        return model.objects.filter(pk__gte=rows[0].pk, pk__lte=rows[-1].pk)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from inventory.cache import cache_stats
+
+class Command(BaseCommand):
+    help = ("Prints hits, misses and hit rate of the cached list endpoints. The counters live in the cache backend, "
+            "so they cover every worker sharing it (a local memory cache only has the counters of its own process).")
+
+    def handle(self, *args, **options):
+        for view_name, stats in cache_stats(['ItemAPIView', 'CategoryAPIView', 'SupplierAPIView', 'PurchaseAPIView', 'ProjectAPIView']).items():
+            hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else '-'
+            self.stdout.write(f"{view_name}: {stats['hits']} hits, {stats['misses']} misses, hit rate {hit_rate}")
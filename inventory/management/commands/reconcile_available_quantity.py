@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Item
+
+class Command(BaseCommand):
+    help = "Checks stored Item.available_quantity against the actual count of available individual items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Correct mismatching items instead of only reporting them.")
+
+    def handle(self, *args, **options):
+        mismatches = Item.reconcile_available_quantity(fix=options['fix'])
+
+        for item_id, (stored, actual) in mismatches.items():
+            self.stdout.write(f"Item {item_id}: stored {stored}, actual {actual}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All available quantities match."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatches)} item(s)."))
+        else:
+            #non-zero exit so scheduled checks can alert on drift
+            self.stderr.write(self.style.ERROR(f"{len(mismatches)} item(s) out of sync, run with --fix to correct them."))
+            raise SystemExit(1)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Category
+
+class Command(BaseCommand):
+    help = "Checks stored Category.categoryQuantity against the summed itemQuantity of its items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Recompute mismatching categories instead of only reporting them.")
+
+    def handle(self, *args, **options):
+        mismatches = Category.reconcile_quantities(fix=options['fix'])
+
+        for category_id, (stored, actual) in mismatches.items():
+            self.stdout.write(f"Category {category_id}: stored {stored}, actual {actual}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All category quantities match."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatches)} category(ies)."))
+        else:
+            self.stderr.write(self.style.ERROR(f"{len(mismatches)} category(ies) out of sync, run with --fix to correct them."))
+            raise SystemExit(1)
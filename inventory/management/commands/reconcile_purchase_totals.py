@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Purchase
+
+class Command(BaseCommand):
+    help = "Checks stored Purchase.totalPrice and finalPriceWithVat against the sum of each purchase's lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Correct mismatching purchases instead of only reporting them.")
+
+    def handle(self, *args, **options):
+        mismatches = Purchase.reconcile_totals(fix=options['fix'])
+
+        for purchase_id, ((stored_total, stored_vat), (actual_total, actual_vat)) in mismatches.items():
+            self.stdout.write(
+                f"Purchase {purchase_id}: stored {stored_total} ({stored_vat} with VAT), "
+                f"actual {actual_total} ({int(actual_vat)} with VAT)"
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All purchase totals match."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatches)} purchase(s)."))
+        else:
+            #non-zero exit so scheduled checks can alert on drift
+            self.stderr.write(self.style.ERROR(f"{len(mismatches)} purchase(s) out of sync, run with --fix to correct them."))
+            raise SystemExit(1)
@@ -0,0 +1,170 @@
+import json
+import random
+import sys
+import threading
+from contextlib import redirect_stdout
+from time import perf_counter
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment, setup_databases, teardown_databases
+from inventory.models import Category, Item, IndividualItem, SupplierItem, Purchase, PurchaseItem, Project, ProjectItem, close_reservation_connection
+from inventory.services import ProjectItemUnit
+
+class Command(BaseCommand):
+    help = ("Runs concurrent workers creating and resizing project allocations, recording purchase lines and changing item "
+            "quantities against a freshly created test database, then checks the inventory invariants and reports throughput "
+            "per concurrency level as JSON. Meant for Postgres, SQLite serializes writers and mostly reports lock errors.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', default='1,2,4,8', help="Comma separated numbers of concurrent workers.")
+        parser.add_argument('--operations', type=int, default=200, help="Operations per worker at every level.")
+        parser.add_argument('--items', type=int, default=20, help="Few items means more workers fighting over the same rows.")
+        parser.add_argument('--units', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help="Reuse (and keep) the test database between runs.")
+
+    #the workers share this process, a change listener would only add evictions the measured workers never see elsewhere
+    @override_settings(INVENTORY_NOTIFY=False)
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['levels'].split(',')]
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            #the signal receivers print progress messages, keeping stdout for the JSON report
+            with redirect_stdout(sys.stderr):
+                call_command(
+                    'generate_inventory_data', seed=options['seed'] + 1000, items=options['items'], units=options['units'],
+                    categories=5, suppliers=5, items_per_supplier=options['items'], purchases=5, projects=10, stdout=self.stderr,
+                )
+                results = []
+                for level in levels:
+                    result = self.run_level(level, options['operations'], options['seed'])
+                    result['violations'] = self.check_invariants()
+                    results.append(result)
+        finally:
+            close_reservation_connection() #an open connection keeps the test database from being dropped
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps({'database': connection.vendor, 'levels': results}, indent=2))
+        if any(result['violations'] for result in results):
+            self.stderr.write(self.style.ERROR("Invariant violations found."))
+            raise SystemExit(1)
+
+    def run_level(self, workers, operations, seed):
+        self.item_ids = list(Item.objects.values_list('pk', flat=True))
+        self.project_ids = list(Project.objects.values_list('pk', flat=True))
+        #one purchase per supplier so every generated line passes PurchaseItem.clean
+        purchase_per_supplier = dict(Purchase.objects.values_list('supplier_id', 'pk'))
+        self.price_list = [
+            (purchase_per_supplier[supplier_id], item_id, category_id, price)
+            for supplier_id, item_id, category_id, price in SupplierItem.objects.filter(supplier_id__in=purchase_per_supplier)
+            .values_list('supplier_id', 'item_id', 'item__itemCategory_id', 'price')
+        ]
+
+        counts = {'ok': 0, 'rejected': 0, 'errors': 0}
+        errors = []
+        lock = threading.Lock()
+
+        def work(worker_number):
+            rng = random.Random(f"{seed}-{workers}-{worker_number}")
+            try:
+                for _ in range(operations):
+                    operation = rng.choice([self.allocate, self.allocate, self.resize, self.purchase, self.change_item])
+                    try:
+                        operation(rng)
+                        outcome = 'ok'
+                    except (ValidationError, ValueError):
+                        #not enough available units, the request would get a 400
+                        outcome = 'rejected'
+                    except Exception as e:
+                        outcome = 'errors'
+                        with lock:
+                            errors.append(f"{operation.__name__}: {e}")
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connections.close_all() #every thread has its own connections
+                close_reservation_connection()
+
+        threads = [threading.Thread(target=work, args=(number,)) for number in range(workers)]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+
+        return {
+            'workers': workers,
+            'operations': workers * operations,
+            **counts,
+            'seconds': round(elapsed, 2),
+            'throughput_ops': round(workers * operations / elapsed, 1),
+            'sample_errors': errors[:5],
+        }
+
+    #operations, each one the same model calls the API views make
+
+    def allocate(self, rng):
+        ProjectItem.objects.create(associated_project_id=rng.choice(self.project_ids), item_id=rng.choice(self.item_ids), quantity=rng.randint(1, 5))
+
+    def resize(self, rng):
+        project_item = ProjectItem.objects.order_by('?').first()
+        if project_item:
+            project_item.quantity = rng.randint(1, 8)
+            project_item.save()
+
+    def purchase(self, rng):
+        purchase_id, item_id, category_id, price = rng.choice(self.price_list)
+        PurchaseItem.objects.create(purchase_id=purchase_id, item_id=item_id, category_id=category_id, quantity=rng.randint(1, 5), price=price)
+
+    def change_item(self, rng):
+        #like ItemAPIView.put: the client sends a new absolute quantity
+        item = Item.objects.get(pk=rng.choice(self.item_ids))
+        item.itemQuantity = max(0, item.itemQuantity + rng.randint(-3, 3))
+        item.save()
+
+    def check_invariants(self):
+        violations = []
+
+        shared_units = ProjectItemUnit.objects.values('individualitem_id').annotate(count=Count('projectitem')).filter(count__gt=1)
+        if shared_units.exists():
+            violations.append(f"{shared_units.count()} unit(s) assigned to more than one project item")
+
+        if ProjectItemUnit.objects.filter(individualitem__is_available=True).exists():
+            violations.append("assigned unit(s) marked as available")
+
+        unassigned_taken = IndividualItem.objects.filter(is_available=False, project_item_item_code=None)
+        if unassigned_taken.exists():
+            violations.append(f"{unassigned_taken.count()} unavailable unit(s) not assigned to any project item")
+
+        wrong_allocations = ProjectItem.objects.annotate(assigned=Count('individual_items')).exclude(assigned=F('quantity'))
+        if wrong_allocations.exists():
+            violations.append(f"{wrong_allocations.count()} project item(s) holding a different number of units than their quantity")
+
+        unit_count = Coalesce(Subquery(
+            IndividualItem.objects.filter(item=OuterRef('pk')).order_by().values('item').annotate(count=Count('pk')).values('count')
+        ), 0)
+        wrong_items = Item.objects.annotate(units=unit_count).exclude(itemQuantity=F('units'))
+        if wrong_items.exists():
+            violations.append(f"{wrong_items.count()} item(s) whose itemQuantity differs from their number of units")
+
+        duplicate_codes = IndividualItem.objects.values('itemCode').annotate(count=Count('pk')).filter(count__gt=1)
+        if duplicate_codes.exists():
+            violations.append(f"{duplicate_codes.count()} duplicated item code(s)")
+
+        for name, mismatches in [
+            ('available_quantity', Item.reconcile_available_quantity()),
+            ('categoryQuantity', Category.reconcile_quantities()),
+            ('purchase totals', Purchase.reconcile_totals()),
+        ]:
+            if mismatches:
+                violations.append(f"{len(mismatches)} stored {name} out of sync")
+        return violations
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_alter_category_categoryquantity'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='Transaction',
+            new_name='Purchase',
+        ),
+        migrations.RenameModel(
+            old_name='TransactionItem',
+            new_name='PurchaseItem',
+        ),
+        migrations.RenameField(
+            model_name='purchaseitem',
+            old_name='transaction',
+            new_name='purchase',
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchase_supplier', to='inventory.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='purchaseitem',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchaseitem_category', to='inventory.category'),
+        ),
+        migrations.AlterField(
+            model_name='purchaseitem',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchaseitem_item', to='inventory.item'),
+        ),
+        migrations.AlterField(
+            model_name='purchaseitem',
+            name='purchase',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchaseitem_purchase', to='inventory.purchase'),
+        ),
+        migrations.RemoveField(
+            model_name='supplieritem',
+            name='supply_date',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_rename_transaction_purchase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemCodeCounter',
+            fields=[
+                ('prefix', models.CharField(max_length=2, primary_key=True, serialize=False)),
+                ('lastNumber', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
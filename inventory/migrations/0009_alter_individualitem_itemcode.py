@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_itemcodecounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='individualitem',
+            name='itemCode',
+            field=models.CharField(max_length=12, unique=True),
+        ),
+    ]
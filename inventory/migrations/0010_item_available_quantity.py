@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_available_quantity(apps, schema_editor):
+    Item = apps.get_model('inventory', 'Item')
+    IndividualItem = apps.get_model('inventory', 'IndividualItem')
+
+    #one set-based update counting every item's available individual items
+    Item.objects.update(available_quantity=Coalesce(Subquery(
+        IndividualItem.objects.filter(item=OuterRef('pk'), is_available=True)
+        .order_by().values('item').annotate(count=Count('pk')).values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_alter_individualitem_itemcode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='available_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_available_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_item_available_quantity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='individualitem',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['item', 'itemCode'], include=('id',), name='individualitem_available_idx'),
+        ),
+    ]
@@ -1,106 +1,414 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, connections, IntegrityError, InterfaceError, OperationalError
+from django.db.models import F, Q, Count, Sum, OuterRef, Subquery, Value, FloatField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Ceil
 from django.core.exceptions import ValidationError
+from inventory.cache import bump_versions
+import re
+import threading
+
+#item code scheme
+#version 1: prefix + 4 digits, eg: RA0010 (numbers 1 to 9999, every code generated before v2 looks like this)
+#version 2: prefix + width marker + digits, eg: RAA10000, RAB123456 (numbers from 10000 onwards)
+#the marker letter encodes how many digits follow (A = 5, B = 6, ...) and letters sort after digits, so ordering by
+#itemCode still follows the number for every prefix; older codes never change and keep resolving as they are
+ITEM_CODE_MAX_LENGTH = 12
+ITEM_CODE_V1_DIGITS = 4
+ITEM_CODE_V2_MARKERS = 'ABCDE' #5 to 9 digits, prefix(2) + marker(1) + 9 digits fits in ITEM_CODE_MAX_LENGTH
+
+def format_item_code(prefix, number):
+    if number < 10 ** ITEM_CODE_V1_DIGITS:
+        return f"{prefix}{number:0{ITEM_CODE_V1_DIGITS}d}"
+
+    digits = str(number)
+    marker_index = len(digits) - ITEM_CODE_V1_DIGITS - 1
+    if marker_index >= len(ITEM_CODE_V2_MARKERS):
+        raise ValueError(f"Item code space for prefix '{prefix}' is exhausted.")
+    return f"{prefix}{ITEM_CODE_V2_MARKERS[marker_index]}{digits}"
+
+def parse_item_code(code, prefix):
+    #returns the number part of a v1 or v2 code of this prefix, None if the code doesn't belong to it
+    if not code.startswith(prefix):
+        return None
+    number_part = code[len(prefix):]
+
+    if len(number_part) == ITEM_CODE_V1_DIGITS and number_part.isdigit():
+        return int(number_part)
+
+    marker, digits = number_part[:1], number_part[1:]
+    if marker and marker in ITEM_CODE_V2_MARKERS and digits.isdigit() \
+            and len(digits) == ITEM_CODE_V2_MARKERS.index(marker) + ITEM_CODE_V1_DIGITS + 1:
+        return int(digits)
+    return None
+
+class PreviousValuesMixin(models.Model):
+    #remembers the database values of `tracked_fields` (attnames) so signal receivers can work with old-to-new deltas
+    #without reloading anything: rows loaded from the database snapshot them for free in from_db, rows built in memory
+    #cost one primary key read right before they are written, and the snapshot follows every save
+    tracked_fields = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #only when every tracked field was loaded, deferred fields would trigger a query each
+        if all(field in instance.__dict__ for field in cls.tracked_fields):
+            instance._previous_values = {field: instance.__dict__[field] for field in cls.tracked_fields}
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        #the reloaded values are what the row holds now, a snapshot from before could be stale (changed by another path since)
+        if fields is None:
+            self._previous_values = None
+            if all(field in self.__dict__ for field in self.tracked_fields):
+                self._previous_values = {field: self.__dict__[field] for field in self.tracked_fields}
+        elif getattr(self, '_previous_values', None) is not None:
+            #partial refresh: the other tracked fields may hold unsaved changes, only the reloaded ones are re-snapshotted
+            refreshed = {self._meta.get_field(name).attname for name in fields}
+            self._previous_values.update({field: getattr(self, field) for field in self.tracked_fields if field in refreshed})
+
+    def previous_values(self):
+        #{field: value} the row had before the pending save, None for rows that aren't in the database yet
+        if self.pk is None:
+            return None
+        if getattr(self, '_previous_values', None) is None:
+            self._previous_values = type(self)._base_manager.filter(pk=self.pk).values(*self.tracked_fields).first()
+        return self._previous_values
+
+    def save(self, *args, **kwargs):
+        #making sure the prior state is known before the row is overwritten, post_save receivers read it from here
+        self.previous_values()
+        super().save(*args, **kwargs)
+        self._remember_saved_values(kwargs.get('update_fields'))
+
+    def _remember_saved_values(self, update_fields=None):
+        #after a save the database holds this instance's values, next save's deltas start from them
+        saved = {field: getattr(self, field) for field in self.tracked_fields}
+        if update_fields is not None and getattr(self, '_previous_values', None) is not None:
+            update_fields = {self._meta.get_field(name).attname for name in update_fields}
+            saved = {field: saved[field] if field in update_fields else self._previous_values[field] for field in saved}
+        self._previous_values = saved
 
 class IndividualItem(models.Model):
     item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='individual_items') #related name is a property that allows items to be searched using that name (here, item belongs to what what items with their codes)
     #default related name is individualitem_set
-    itemCode = models.CharField(max_length=6, unique=True)
+    itemCode = models.CharField(max_length=ITEM_CODE_MAX_LENGTH, unique=True) #unique index serves exact code lookups, see format_item_code for the scheme
     is_available = models.BooleanField(default=True)  #to track if item is assigned/used
     price = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            #allocation, shrink, purchase pricing and available counts all read "available items of one item ordered by itemCode",
+            #a partial index over just the available rows serves them as a range scan already in order (no sort),
+            #id is included so picking unit ids is an index only scan on postgres
+            models.Index(
+                fields=['item', 'itemCode'],
+                include=['id'],
+                condition=Q(is_available=True),
+                name='individualitem_available_idx',
+            ),
+        ]
+
+    def delete(self, *args, **kwargs):
+        #single item deletes (api, admin) keep the stored available count of the parent item exact
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.is_available:
+                Item.change_available_quantity(self.item_id, -1)
+        return result
+
     def __str__(self):
         return self.itemCode
 
-class Item(models.Model):
+class Item(PreviousValuesMixin, models.Model):
     itemName = models.CharField(max_length=30)
     itemQuantity = models.PositiveIntegerField(default=1)
     itemCategory = models.ForeignKey('Category', on_delete=models.PROTECT, related_name='item_category')
+    #number of individual items with is_available=True, stored so listings don't count per item
+    #only ever changed with F() updates by the code generation, shrink, allocation and release paths (see change_available_quantity)
+    available_quantity = models.PositiveIntegerField(default=0, editable=False)
 
-    def save(self, *args, **kwargs):
+    tracked_fields = ('itemQuantity', 'itemCategory_id') #the post_save receiver moves quantity deltas between category totals
+
+    def save(self, *args, unit_price=0, **kwargs):
+        #unit_price is stamped on the individual items this save creates, so a purchase prices its units as they are inserted
         is_new = self.pk is None  #this checks if the pk attribute is None. If it is, the instance has not been saved to the database 
         #yet, meaning it's a new instance.
         
         #if self.pk is none, the code below is triggered, else old_quantity doesn't exist hence it becomes 0, simple ternary operator
-        #if old_quantity exists, it queries the database to get the current itemQuantity of this item and flat=True makes sure its a list and not list of tuples
+        #if old_quantity exists, it queries the database to get the current itemQuantity (and category) of this item as a dict
         #first() is used because i) if queryset is empty, returns none instead of exception so separate exception handeling is not needed
         #converts from queryset (which is iterable) to actual value. if get was used, have to have a separate exception handeling logic
-        old_quantity = Item.objects.filter(pk=self.pk).values_list('itemQuantity', flat=True).first() if self.pk else 0
-        
-        #if quantity is being reduced/deleted
-        if self.pk and self.itemQuantity < old_quantity:
-            excess_quantity = old_quantity - self.itemQuantity
-            #checking available quantity
-            available_quantity = self.individual_items.filter(is_available=True).count()
-            #if there are not enough available items to delete, raising error which will later be handled by view
-            if available_quantity < excess_quantity:
-                raise ValueError(f"Cannot reduce quantity. Only {available_quantity} items are available to delete.")
+        #select_for_update locks the item row until the transaction ends, so concurrent quantity changes of the same item run one after another
+        with transaction.atomic():
+            #the locked read doubles as the previous values snapshot, an in-memory snapshot could be stale by the time the lock is held
+            self._previous_values = Item.objects.select_for_update().filter(pk=self.pk).values(*self.tracked_fields).first() if self.pk else None
+            old_quantity = self._previous_values['itemQuantity'] if self._previous_values else 0
             
-            #materializing queryset into a list to avoid slicing issues with delete()
-            excess_items = list(
-                self.individual_items.filter(is_available=True)
-                .order_by('-itemCode')[:excess_quantity]
-            )
-            
-            #saving the main items
-            super().save(*args, **kwargs)
-            
-            #iterating over excess items to delete
-            for item in excess_items:
-                item.delete()
-        else:
-            #for new and existing items, manipulating quantity according to user needs
-            super().save(*args, **kwargs)
+            #never writing the in-memory available_quantity back over the stored counter, it may be stale by now
+            if not is_new and kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name != 'available_quantity'
+                ]
             
-            if is_new:
-                self._generate_individual_codes(self.itemQuantity)
-            elif self.itemQuantity > old_quantity:
-                additional_quantity = self.itemQuantity - old_quantity
-                self._generate_individual_codes(additional_quantity)
+            #if quantity is being reduced/deleted
+            if self.pk and self.itemQuantity < old_quantity:
+                excess_quantity = old_quantity - self.itemQuantity
+                
+                #saving the main items
+                super().save(*args, **kwargs)
+                
+                #deleting excess items in one go, raises ValueError (handled by view) and rolls back the save if not enough are available
+                #removed_units reports how many individual items the save deleted
+                self.removed_units = self._remove_individual_codes(excess_quantity)
+            else:
+                #for new and existing items, manipulating quantity according to user needs
+                super().save(*args, **kwargs)
+                
+                if is_new:
+                    self._generate_individual_codes(self.itemQuantity, unit_price)
+                elif self.itemQuantity > old_quantity:
+                    additional_quantity = self.itemQuantity - old_quantity
+                    self._generate_individual_codes(additional_quantity, unit_price)
 
-    def _generate_individual_codes(self, quantity):
-        #extracting the first two letters of the itemName and converting them to uppercase to form a prefix for the unique code.
-        prefix = self.itemName[:2].upper() #:2 means taking 2 characters from start
+    @staticmethod
+    def add_quantity(item_id, delta, unit_price=0):
+        #changes itemQuantity by delta on top of the locked current row instead of a possibly stale in-memory copy,
+        #so concurrent purchases of the same item add up instead of the later save undoing the earlier one
+        with transaction.atomic():
+            item = Item.objects.select_for_update().get(pk=item_id)
+            item.itemQuantity += delta
+            item.save(unit_price=unit_price)
+        return item
+
+    def _remove_individual_codes(self, quantity):
+        #available units are never assigned to a project item, clearing stray links first (one filtered delete, normally no rows)
+        #so the units below can go without the collector loading them
+        ProjectItem.individual_items.through.objects.filter(
+            individualitem__item_id=self.pk, individualitem__is_available=True
+        ).delete()
+
+        #one set-based statement: DELETE ... WHERE id IN (SELECT id ... ORDER BY itemCode DESC LIMIT n FOR UPDATE SKIP LOCKED)
+        #deletes the newest available items, skip_locked leaves out items a concurrent project allocation is currently taking
+        excess_units = (
+            self.individual_items.filter(is_available=True)
+            .select_for_update(skip_locked=True)
+            .order_by('-itemCode')
+            .values('pk')[:quantity]
+        )
+        #written out instead of queryset.delete(), whose collector would load every unit looking for cascades and signals to run:
+        #only valid while nothing else references IndividualItem (the project links are cleared above) and nothing listens to
+        #its deletes, a new relation or receiver has to be handled here as well
+        using = self._state.db or 'default'
+        db = connections[using]
+        subquery, params = excess_units.query.get_compiler(using).as_sql()
+        with db.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {db.ops.quote_name(IndividualItem._meta.db_table)} "
+                f"WHERE {db.ops.quote_name(IndividualItem._meta.pk.column)} IN ({subquery})",
+                params,
+            )
+            removed = cursor.rowcount
         
-        #getting the last used number for this prefix
-        last_item = IndividualItem.objects.filter(
-            itemCode__startswith=prefix
-        ).order_by('-itemCode').first() #checking from highest; descending order, and taking first value
+        #if there were not enough available items to delete, raising error which will later be handled by view
+        #the caller's transaction (Item.save) rolls the delete back
+        if removed < quantity:
+            raise ValueError(f"Cannot reduce quantity. Only {removed} items are available to delete.")
+        
+        Item.change_available_quantity(self.pk, -removed)
+        self.available_quantity -= removed
+        return removed
 
-        #if previous code doesn't exist, starts at 1
-        start_number = 1
-        if last_item:
-            #if a previous code exists, extracting the last most number, converting to int and increasing by 1
-            number_part = last_item.itemCode[2:] #2: means taking after 2 characters from start
-            start_number = int(number_part) + 1
+    @staticmethod
+    def change_available_quantity(item_id, delta):
+        #applying the change in the database so concurrent changes add up instead of overwriting each other
+        if delta:
+            Item.objects.filter(pk=item_id).update(available_quantity=F('available_quantity') + delta)
+            bump_versions('item') #queryset updates send no signals, cached item lists are invalidated here
+
+    @staticmethod
+    def reconcile_available_quantity(items=None, fix=False):
+        #compares stored available_quantity against the actual count of available individual items
+        #returns {item_id: (stored, actual)} for mismatching items, and corrects them in one update when fix=True
+        actual_count = Coalesce(Subquery(
+            IndividualItem.objects.filter(item=OuterRef('pk'), is_available=True)
+            .order_by().values('item').annotate(count=Count('pk')).values('count')
+        ), 0)
+        items = items if items is not None else Item.objects.all()
+
+        mismatches = {
+            item_id: (stored, actual)
+            for item_id, stored, actual in items.annotate(actual_count=actual_count)
+            .exclude(available_quantity=F('actual_count'))
+            .values_list('pk', 'available_quantity', 'actual_count')
+        }
+        if fix and mismatches:
+            Item.objects.filter(pk__in=mismatches).update(available_quantity=actual_count)
+            bump_versions('item')
+        return mismatches
+
+    @property
+    def code_prefix(self):
+        #extracting the first two letters of the itemName and converting them to uppercase to form a prefix for the unique code.
+        return self.itemName[:2].upper() #:2 means taking 2 characters from start
+
+    def _generate_individual_codes(self, quantity, price=0):
+        #reserving a block of numbers for this prefix from the counter table instead of scanning existing codes,
+        #so concurrent purchases never hand out the same code and the cost doesn't grow with the IndividualItem table
+        start_number = ItemCodeCounter.reserve(self.code_prefix, quantity)
 
-        #creating individual items with unique codes (in bulk if required)
+        #saving at bult to database (efficient)
+        IndividualItem.objects.bulk_create(self._build_individual_items(start_number, quantity, price))
+        Item.change_available_quantity(self.pk, quantity)
+        self.available_quantity += quantity
+
+    def _build_individual_items(self, start_number, quantity, price=0):
+        #creating individual items with unique codes from an already reserved block of numbers
+        prefix = self.code_prefix
         individual_items = []
         for i in range(quantity):
             number = start_number + i
-            #using 4 digits for the number part (allowing up to 9999 items)
-            item_code = f"{prefix}{number:04d}" #unique code syntax = prefix + 4 digit number. eg: if Raspberry Pi's 10th item, code = RA0010
+            #4 digits for the first 9999 items of a prefix, wider v2 codes after that
+            item_code = format_item_code(prefix, number) #eg: if Raspberry Pi's 10th item, code = RA0010, 12345th item = RAA12345
 
             #creating individual_item object but not saving to database yet
             individual_items.append(IndividualItem(
                 item=self, #linking IndividualItem to the current Item instance
-                itemCode=item_code #assigning generated code
+                itemCode=item_code, #assigning generated code
+                price=price,
             ))
-        #saving at bult to database (efficient)
-        IndividualItem.objects.bulk_create(individual_items)
+        return individual_items
 
     def __str__(self):
         return f"{self.itemName}"
 
-    #@property allows it to be accessed like an attribute (eg: item.available_quantity without paranthesis) without explicitly calling it as a method; read-only property
-    #provides encapsulation and easier access to users
-    @property
-    def available_quantity(self):
-        return self.individual_items.filter(is_available=True).count() #accessing related items because of foreign key through self.individual_items which is the related name, counting no of available items
+#per thread database connections ItemCodeCounter.reserve takes its blocks through, see ITEM_CODE_AUTOCOMMIT
+_reservation_connections = threading.local()
+
+def close_reservation_connection():
+    #closes this thread's reservation connection, for threads that end (workers) or a test database about to be dropped
+    db = getattr(_reservation_connections, 'db', None)
+    if db is not None:
+        db.close()
+        _reservation_connections.db = None
+
+class ItemCodeCounter(models.Model):
+    #one row per code prefix holding the last number handed out, so reserving codes is a single row update
+    prefix = models.CharField(max_length=2, primary_key=True)
+    lastNumber = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, prefix, quantity):
+        #returns the first number of a block of `quantity` numbers reserved for this prefix
+        db = connections['default']
+        if db.in_atomic_block and db.vendor == 'postgresql' and getattr(settings, 'ITEM_CODE_AUTOCOMMIT', False):
+            return cls._reserve_autocommit(prefix, quantity)
+
+        with transaction.atomic():
+            #the update locks the counter row until the block is handed out, parallel workers just queue behind it
+            updated = cls.objects.filter(prefix=prefix).update(lastNumber=F('lastNumber') + quantity)
+            if not updated:
+                try:
+                    #savepoint so a concurrent creation of the same counter doesn't break the outer transaction
+                    with transaction.atomic():
+                        cls.objects.create(prefix=prefix, lastNumber=cls._last_used_number(prefix) + quantity)
+                except IntegrityError:
+                    #another worker created the counter first, reserving from it instead
+                    cls.objects.filter(prefix=prefix).update(lastNumber=F('lastNumber') + quantity)
+
+            last_number = cls.objects.filter(prefix=prefix).values_list('lastNumber', flat=True).get()
+        return last_number - quantity + 1
+
+    @classmethod
+    def _reserve_autocommit(cls, prefix, quantity):
+        #inside the caller's transaction the counter row would stay locked until it commits, queueing every other purchase of
+        #the prefix behind a whole bill or import: the block is taken in one statement on a separate autocommit connection
+        #instead, locking the row for that statement only
+        #the numbers stay reserved when the caller's transaction rolls back, so codes can have gaps
+        table = connections['default'].ops.quote_name(cls._meta.db_table)
+        last_number = connections['default'].ops.quote_name(cls._meta.get_field('lastNumber').column)
+        for attempt in range(2):
+            db = getattr(_reservation_connections, 'db', None)
+            if db is None:
+                db = _reservation_connections.db = connections.create_connection('default')
+            try:
+                with db.cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE {table} SET {last_number} = {last_number} + %s WHERE prefix = %s RETURNING {last_number}",
+                        [quantity, prefix],
+                    )
+                    row = cursor.fetchone()
+                    if row is None:
+                        #first block of the prefix, another worker creating the counter at the same time is added to instead
+                        cursor.execute(
+                            f"INSERT INTO {table} (prefix, {last_number}) VALUES (%s, %s) "
+                            f"ON CONFLICT (prefix) DO UPDATE SET {last_number} = {table}.{last_number} + %s RETURNING {last_number}",
+                            [prefix, cls._last_used_number(prefix) + quantity, quantity],
+                        )
+                        row = cursor.fetchone()
+                return row[0] - quantity + 1
+            except (InterfaceError, OperationalError):
+                #the connection was dropped (server restart, idle timeout), reconnecting once, a lost block is just a gap
+                close_reservation_connection()
+                if attempt:
+                    raise
+
+    @staticmethod
+    def _last_used_number(prefix):
+        #only run once per prefix when its counter is first created, picking up codes generated before counters existed
+        #startswith narrows to the prefix range of the itemCode index, regex drops codes of longer prefixes (eg: RA0005 or RB000007
+        #when prefix is R) by only accepting the exact width of every marker, so the highest match always parses
+        number_patterns = [f'[0-9]{{{ITEM_CODE_V1_DIGITS}}}'] + [
+            f'{marker}[0-9]{{{ITEM_CODE_V1_DIGITS + 1 + index}}}' for index, marker in enumerate(ITEM_CODE_V2_MARKERS)
+        ]
+        last_item = IndividualItem.objects.filter(
+            itemCode__startswith=prefix,
+            itemCode__regex=rf'^{re.escape(prefix)}({"|".join(number_patterns)})$',
+        ).order_by('-itemCode').first() #checking from highest; descending order, and taking first value
+
+        if last_item:
+            return parse_item_code(last_item.itemCode, prefix) or 0
+        return 0
+
+    def __str__(self):
+        return f"{self.prefix}: {self.lastNumber}"
 
 class Category(models.Model):
     categoryName = models.CharField(max_length=30, unique=True)
     categoryQuantity = models.PositiveIntegerField(default=0)
     
+    @staticmethod
+    def change_quantity(category_id, delta):
+        #applying item quantity changes as a delta in the database instead of re-summing every item of the category
+        if delta:
+            Category.objects.filter(pk=category_id).update(categoryQuantity=F('categoryQuantity') + delta)
+            bump_versions('category') #queryset updates send no signals, cached category lists are invalidated here
+
+    @staticmethod
+    def reconcile_quantities(categories=None, fix=False):
+        #repair operation: compares categoryQuantity against the sum of its items' itemQuantity
+        #returns {category_id: (stored, actual)} for mismatching categories, and corrects them in one update when fix=True
+        actual_quantity = Coalesce(Subquery(
+            Item.objects.filter(itemCategory=OuterRef('pk'))
+            .order_by().values('itemCategory').annotate(total=Sum('itemQuantity')).values('total')
+        ), 0)
+        categories = categories if categories is not None else Category.objects.all()
+
+        mismatches = {
+            category_id: (stored, actual)
+            for category_id, stored, actual in categories.annotate(actual_quantity=actual_quantity)
+            .exclude(categoryQuantity=F('actual_quantity'))
+            .values_list('pk', 'categoryQuantity', 'actual_quantity')
+        }
+        if fix and mismatches:
+            Category.objects.filter(pk__in=mismatches).update(categoryQuantity=actual_quantity)
+            bump_versions('category')
+        return mismatches
+
     def __str__(self):
         return self.categoryName
 
@@ -122,60 +430,50 @@ class Supplier(models.Model):
     def __str__(self):
         return self.supplierName
 
-class PurchaseItem(models.Model):
+class PurchaseItem(PreviousValuesMixin, models.Model):
     purchase = models.ForeignKey('Purchase', on_delete=models.CASCADE, related_name='purchaseitem_purchase')
     item = models.ForeignKey('Item', on_delete=models.PROTECT, related_name='purchaseitem_item')
     category = models.ForeignKey('Category', on_delete=models.PROTECT, related_name='purchaseitem_category')
     quantity = models.PositiveIntegerField()
     price = models.PositiveIntegerField()
+
+    tracked_fields = ('purchase_id', 'item_id', 'quantity', 'price') #update_purchase applies the line's old-to-new change
     
     def clean(self):
+        from inventory.services import supplier_price_list #services imports the models
+
         #checking if required fields exist
-        if not all([self.purchase, self.item, self.category]):
+        if not all([self.purchase_id, self.item_id, self.category_id]):
             raise ValidationError("Purchase, Item and Category must be set")
             
-        #category Validation
-        if self.item.itemCategory != self.category:
+        #category Validation, comparing ids so the category itself is only loaded for the error message
+        if self.item.itemCategory_id != self.category_id:
             raise ValidationError({
                 'category': f"Category mismatch for item: {self.item.itemName}. "
                            f"Expected {self.item.itemCategory}, got {self.category}"
             })
             
-        #supplier Validation
-        purchase_supplier = self.purchase.supplier
-        
-        is_supplied = SupplierItem.objects.filter(
-            supplier=purchase_supplier,
-            item=self.item
-        ).exists()
+        #supplier and price Validation against the supplier's cached price list, no query per line
+        supplier_id = self.purchase.supplier_id
+        supplied_price = supplier_price_list(supplier_id).get(self.item_id)
         
-        if not is_supplied:
+        if supplied_price is None:
             raise ValidationError({
-                'item': f"Supplier '{purchase_supplier.supplierName}' "
+                'item': f"Supplier '{self.purchase.supplier.supplierName}' "
                        f"doesn't supply the item '{self.item.itemName}'"
             })
             
-        #price Validation
-        price_of_supplied_item = SupplierItem.objects.filter(
-            supplier=purchase_supplier,
-            item=self.item
-        ).first()
-        
-        if not price_of_supplied_item:
-            raise ValidationError({
-                'price': f"No price information found for item '{self.item.itemName}' "
-                        f"from supplier '{purchase_supplier.supplierName}'"
-            })
-            
-        if self.price != price_of_supplied_item.price:
+        if self.price != supplied_price:
             raise ValidationError({
                 'price': f"Price mismatch for item '{self.item.itemName}'. "
-                        f"Expected {price_of_supplied_item.price}, got {self.price}"
+                        f"Expected {supplied_price}, got {self.price}"
             })
     
     def save(self, *args, **kwargs):
         self.full_clean()  #calling the clean() method, full_clean validates all fields and custom validation code as well
-        super().save(*args, **kwargs)
+        #the purchase totals and item quantities are updated in post_save, so the line and those updates commit or roll back together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
         
     def __str__(self):
         return self.purchase.billNo
@@ -187,6 +485,46 @@ class Purchase(models.Model):
     finalPriceWithVat = models.PositiveIntegerField(editable=False, null=True, blank=True)
     date = models.DateTimeField(auto_now_add=True)
     paymentStatus = models.CharField(max_length=8, default='Pending') #paid or not paid/pending
+
+    VAT_MULTIPLIER = 1.13 #13% VAT, finalPriceWithVat = ceil(totalPrice * VAT_MULTIPLIER)
+
+    @staticmethod
+    def with_vat(total):
+        #database side ceil(total * 1.13), same float arithmetic as math.ceil on the python side
+        return Ceil(ExpressionWrapper(total * Value(Purchase.VAT_MULTIPLIER), output_field=FloatField()))
+
+    @staticmethod
+    def change_total(purchase_id, delta):
+        #applying the change of one line to the stored totals in a single statement, the VAT is derived from the same new total
+        #so concurrent line changes add up and the two columns can never disagree
+        if delta:
+            new_total = Coalesce(F('totalPrice'), 0) + delta
+            Purchase.objects.filter(pk=purchase_id).update(totalPrice=new_total, finalPriceWithVat=Purchase.with_vat(new_total))
+            bump_versions('purchase') #queryset updates send no signals
+
+    @staticmethod
+    def reconcile_totals(purchases=None, fix=False):
+        #repair operation: compares totalPrice and finalPriceWithVat against the sum of the purchase's lines
+        #returns {purchase_id: ((stored total, stored vat), (actual total, actual vat))} for mismatching purchases,
+        #and corrects them in one update when fix=True
+        actual_total = Coalesce(Subquery(
+            PurchaseItem.objects.filter(purchase=OuterRef('pk'))
+            .order_by().values('purchase').annotate(total=Sum(F('quantity') * F('price'))).values('total')
+        ), 0)
+        purchases = purchases if purchases is not None else Purchase.objects.all()
+
+        mismatches = {
+            purchase_id: ((stored_total, stored_vat), (actual, actual_vat))
+            for purchase_id, stored_total, stored_vat, actual, actual_vat in purchases
+            .annotate(actual_total=actual_total, actual_vat=Purchase.with_vat(actual_total))
+            .annotate(stored_total=Coalesce(F('totalPrice'), 0), stored_vat=Coalesce(F('finalPriceWithVat'), 0))
+            .filter(~Q(stored_total=F('actual_total')) | ~Q(stored_vat=F('actual_vat')))
+            .values_list('pk', 'totalPrice', 'finalPriceWithVat', 'actual_total', 'actual_vat')
+        }
+        if fix and mismatches:
+            Purchase.objects.filter(pk__in=mismatches).update(totalPrice=actual_total, finalPriceWithVat=Purchase.with_vat(actual_total))
+            bump_versions('purchase')
+        return mismatches
     
     def __str__(self):
         return self.billNo
@@ -195,12 +533,26 @@ class Project(models.Model):
     projectName = models.CharField(max_length=40)
     projectLeader = models.CharField(max_length=30)
     
+    def delete(self, *args, **kwargs):
+        from inventory.services import project_units_released #imported here as services imports the models
+
+        #releasing every unit of the project in a few set-based statements before the cascade removes its ProjectItems
+        with project_units_released(self):
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return self.projectName
     
-class ProjectItem(models.Model):
+class ProjectItem(PreviousValuesMixin, models.Model):
     associated_project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='project_item_project')
     item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='project_item')
     quantity = models.PositiveIntegerField(default=1)
     start_date = models.DateTimeField(auto_now_add=True)
-    individual_items = models.ManyToManyField(IndividualItem, blank=False, related_name='project_item_item_code')
\ No newline at end of file
+    individual_items = models.ManyToManyField(IndividualItem, blank=False, related_name='project_item_item_code')
+
+    tracked_fields = ('quantity',) #the availability check and the allocation only need the quantity change
+
+    def save(self, *args, **kwargs):
+        #units are allocated in post_save, so the row and its allocation commit or roll back together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
\ No newline at end of file
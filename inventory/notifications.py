@@ -0,0 +1,118 @@
+import atexit
+import json
+import logging
+import os
+import select
+import threading
+from django.conf import settings
+from django.db import connection, connections
+
+logger = logging.getLogger('inventory.notifications')
+
+#cross-worker invalidation of the per process caches (local memory list versions, supplier price lists) over postgres LISTEN/NOTIFY:
+#write paths publish what changed on CHANNEL, a listener thread in every worker process evicts its own copies
+#notifications sent inside a transaction are only delivered when it commits, a rolled back write never evicts anything
+CHANNEL = 'inventory_changes'
+
+_listener = None
+_listener_lock = threading.Lock()
+
+def notifications_enabled():
+    return connection.vendor == 'postgresql' and getattr(settings, 'INVENTORY_NOTIFY', False)
+
+def notify(kind, values=()):
+    #kind: 'versions' (list version counter names) or 'price_lists' (supplier ids, empty for all of them)
+    if not notifications_enabled():
+        return
+    payload = json.dumps({'pid': os.getpid(), 'kind': kind, 'values': list(values)})
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+def ensure_listener():
+    #starts this process' listener on first use, returns whether one is running
+    #called per request instead of from AppConfig.ready so management commands don't start one and every forked worker gets its own
+    global _listener
+    if not notifications_enabled():
+        return False
+    if _listener is not None and _listener.pid == os.getpid() and _listener.is_alive():
+        return True
+    with _listener_lock:
+        if _listener is None or _listener.pid != os.getpid() or not _listener.is_alive():
+            _listener = ChangeListener()
+            _listener.start()
+            atexit.register(_listener.stop)
+    return True
+
+def evict(kind, values):
+    from inventory.cache import bump_local_versions, MODEL_VERSIONS
+    from inventory.services import forget_supplier_price_list
+
+    if kind == 'versions':
+        bump_local_versions(values)
+    elif kind == 'price_lists':
+        if not values:
+            forget_supplier_price_list()
+        for supplier_id in values:
+            forget_supplier_price_list(supplier_id)
+    elif kind == 'all':
+        bump_local_versions({name for names in MODEL_VERSIONS.values() for name in names})
+        forget_supplier_price_list()
+
+class ChangeListener(threading.Thread):
+    #holds its own database connection (django connections are per thread) in LISTEN mode and waits on its socket
+    poll_timeout = 30
+    retry_delay = 5
+
+    def __init__(self):
+        super().__init__(name='inventory-change-listener', daemon=True)
+        self.pid = os.getpid()
+        self.stopping = threading.Event()
+        #written to by stop() to wake the select below, the connection itself is only ever touched from this thread
+        self.wakeup_read, self.wakeup_write = os.pipe()
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self.listen()
+                except Exception:
+                    if self.stopping.is_set():
+                        break
+                    logger.exception("Inventory change listener lost its connection, reconnecting")
+                    connections['default'].close()
+                    self.stopping.wait(self.retry_delay)
+        finally:
+            connections['default'].close()
+            os.close(self.wakeup_read)
+
+    def stop(self, timeout=5):
+        #registered with atexit: daemon threads are killed without cleanup, so the LISTEN connection is closed from its own thread
+        if self.stopping.is_set() or self.pid != os.getpid():
+            return
+        self.stopping.set()
+        os.write(self.wakeup_write, b'x')
+        self.join(timeout)
+        os.close(self.wakeup_write)
+
+    def listen(self):
+        db = connections['default']
+        db.ensure_connection()
+        pg_connection = db.connection #the raw psycopg2 connection, in autocommit mode like every django connection
+        with pg_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        #notifications sent while this process wasn't listening (startup, reconnect) are lost, so dropping everything once
+        evict('all', ())
+
+        while not self.stopping.is_set():
+            readable, _, _ = select.select([pg_connection, self.wakeup_read], [], [], self.poll_timeout)
+            if pg_connection not in readable:
+                continue
+            pg_connection.poll()
+            while pg_connection.notifies:
+                self.handle(pg_connection.notifies.pop(0).payload)
+
+    def handle(self, payload):
+        message = json.loads(payload)
+        if message['pid'] == self.pid:
+            return #this process already evicted its own copies when it made the change
+        evict(message['kind'], message['values'])
@@ -1,19 +1,24 @@
 from rest_framework import serializers
-from rest_framework.serializers import SerializerMethodField
 from rest_framework.exceptions import ValidationError
 from inventory.models import *
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from collections import defaultdict
+from math import ceil
+from inventory.services import supplier_price_list
+from inventory.cache import bump_versions
+
+def read_values(queryset, fields):
+    #read only fast path for list GETs: plain dicts straight from .values() under the serializer's field names (a foreign key
+    #comes back as its id, like a PrimaryKeyRelatedField renders it), no model instances and no per field to_representation
+    #only for serializers made of plain model fields, writes and validation keep going through the ModelSerializers
+    return queryset.values(*fields)
 
 class ItemSerializer(serializers.ModelSerializer):
-    #used to include custom properties or computed fields in the serialized output
-    available_quantity = serializers.SerializerMethodField()
-
     class Meta:
         model = Item
         fields = ['id', 'itemName', 'itemQuantity', 'itemCategory', 'available_quantity']
-
-    def get_available_quantity(self, obj):
-        return obj.available_quantity
+        read_only_fields = ['available_quantity'] #stored counter maintained by the models and signals, not by clients
 
 class IndividualItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -99,6 +104,116 @@ class PurchaseSerializer(serializers.ModelSerializer):
         model = Purchase
         fields = ['id', 'billNo', 'supplier', 'totalPrice', 'finalPriceWithVat', 'paymentStatus', 'purchaseitem_purchase']
 
+class PurchaseLineSerializer(serializers.Serializer):
+    #plain ids instead of related fields, all lines of a bill are checked together in PurchaseBillSerializer.validate
+    item = serializers.IntegerField(source='item_id')
+    category = serializers.IntegerField(source='category_id')
+    quantity = serializers.IntegerField(min_value=1)
+    price = serializers.IntegerField(min_value=0)
+
+class PurchaseBillSerializer(serializers.ModelSerializer):
+    #a whole supplier bill (header + lines) recorded in one transaction with bulk writes
+    purchaseitem_purchase = PurchaseLineSerializer(many=True, allow_empty=False)
+
+    class Meta:
+        model = Purchase
+        fields = ['id', 'billNo', 'supplier', 'totalPrice', 'finalPriceWithVat', 'paymentStatus', 'purchaseitem_purchase']
+
+    def validate(self, data):
+        supplier = data['supplier']
+        lines = data['purchaseitem_purchase']
+
+        #the supplier's cached price list plus one query for the category and name of every item on the bill,
+        #same rules as PurchaseItem.clean
+        price_list = supplier_price_list(supplier.pk)
+        items = {
+            item_id: (category_id, item_name)
+            for item_id, category_id, item_name in Item.objects.filter(
+                pk__in={line['item_id'] for line in lines}
+            ).values_list('pk', 'itemCategory_id', 'itemName')
+        }
+
+        line_errors = {}
+        for index, line in enumerate(lines):
+            errors = {}
+            if line['item_id'] not in price_list or line['item_id'] not in items:
+                #named like PurchaseItem.clean names it, the id only for an item that doesn't exist
+                item_name = items[line['item_id']][1] if line['item_id'] in items else line['item_id']
+                errors['item'] = f"Supplier '{supplier.supplierName}' doesn't supply the item '{item_name}'"
+            else:
+                price = price_list[line['item_id']]
+                category_id, item_name = items[line['item_id']]
+                if line['category_id'] != category_id:
+                    errors['category'] = f"Category mismatch for item: {item_name}. Expected {category_id}, got {line['category_id']}"
+                if line['price'] != price:
+                    errors['price'] = f"Price mismatch for item '{item_name}'. Expected {price}, got {line['price']}"
+            if errors:
+                line_errors[index] = errors #keyed by the position of the line in the bill
+
+        if line_errors:
+            raise serializers.ValidationError({'purchaseitem_purchase': line_errors})
+        return data
+
+    def create(self, validated_data):
+        lines = validated_data.pop('purchaseitem_purchase')
+
+        quantity_per_item = defaultdict(int)
+        price_per_item = {}
+        quantity_per_category = defaultdict(int)
+        for line in lines:
+            quantity_per_item[line['item_id']] += line['quantity']
+            price_per_item[line['item_id']] = line['price'] #validated against the supplier price, so the same for every line of an item
+            quantity_per_category[line['category_id']] += line['quantity']
+
+        total_price = sum(line['quantity'] * line['price'] for line in lines)
+
+        with transaction.atomic():
+            purchase = Purchase.objects.create(
+                totalPrice=total_price,
+                finalPriceWithVat=ceil(total_price * Purchase.VAT_MULTIPLIER),
+                **validated_data,
+            )
+            #lines are already validated, bulk_create skips the per line full_clean and signals
+            PurchaseItem.objects.bulk_create([
+                PurchaseItem(
+                    purchase=purchase,
+                    item_id=line['item_id'],
+                    category_id=line['category_id'],
+                    quantity=line['quantity'],
+                    price=line['price'],
+                )
+                for line in lines
+            ])
+
+            #locking the items in pk order (same order for every bill so concurrent bills can't deadlock)
+            items = list(Item.objects.select_for_update().filter(pk__in=quantity_per_item).order_by('pk'))
+
+            #one code block reservation per prefix, handed out to the items of that prefix in turn
+            quantity_per_prefix = defaultdict(int)
+            for item in items:
+                quantity_per_prefix[item.code_prefix] += quantity_per_item[item.pk]
+            next_number = {
+                prefix: ItemCodeCounter.reserve(prefix, quantity)
+                for prefix, quantity in sorted(quantity_per_prefix.items())
+            }
+
+            individual_items = []
+            for item in items:
+                quantity = quantity_per_item[item.pk]
+                individual_items += item._build_individual_items(next_number[item.code_prefix], quantity, price_per_item[item.pk])
+                next_number[item.code_prefix] += quantity
+                item.itemQuantity += quantity
+                item.available_quantity += quantity
+            IndividualItem.objects.bulk_create(individual_items)
+
+            #rows are locked, so writing the new quantities back in one statement can't lose a concurrent change
+            Item.objects.bulk_update(items, ['itemQuantity', 'available_quantity'])
+            bump_versions('item') #bulk_update sends no signals
+            for category_id, quantity in quantity_per_category.items():
+                Category.change_quantity(category_id, quantity)
+
+        return purchase
+
 class ProjectItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectItem
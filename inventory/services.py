@@ -0,0 +1,195 @@
+from collections import defaultdict
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.db.models import Count, Case, When, Value, F, PositiveIntegerField
+from django.core.exceptions import ValidationError
+from inventory.cache import bump_versions
+from inventory.models import IndividualItem, Item, ProjectItem, SupplierItem, Category, Purchase, PurchaseItem
+
+#set-based operations behind the ProjectItem signals: a constant number of statements however many units are involved
+
+ProjectItemUnit = ProjectItem.individual_items.through #auto created m2m table linking project items to their units
+
+#{supplier_id: {item_id: price}}, filled by supplier_price_list and emptied by SupplierItem writes and at the start of every request
+_supplier_price_lists = {}
+#bumped by every forget_supplier_price_list (a write in this process or the change listener thread), a price list read while it
+#moved may predate that write and is returned to its caller but not stored
+_price_list_generation = 0
+_price_list_lock = threading.Lock()
+
+#ids of the aggregates touched inside the current deferred_recompute block, None outside of one
+_deferred_recompute = ContextVar('deferred_recompute', default=None)
+
+#projects whose units Project.delete already released in bulk, the per ProjectItem delete signal skips them
+_released_projects = ContextVar('released_projects', default=frozenset())
+
+def allocate_units(project_item, quantity):
+    #assigns `quantity` available units of the project item's item to it, returns how many were assigned
+    if quantity <= 0:
+        return 0
+
+    with transaction.atomic():
+        #skip_locked passes over units a concurrent allocation (or shrink) has already picked, so parallel allocations of the
+        #same item don't wait on each other, and a unit can only ever be picked by the one transaction holding its lock
+        unit_ids = list(
+            IndividualItem.objects.filter(item_id=project_item.item_id, is_available=True)
+            .select_for_update(skip_locked=True)
+            .order_by('itemCode')
+            .values_list('id', flat=True)[:quantity]
+        )
+        if len(unit_ids) < quantity:
+            #raised before anything is written, the caller's transaction rolls the ProjectItem save back
+            raise ValidationError(
+                f'Not enough available items. Requested: {quantity}, '
+                f'Available: {len(unit_ids)}'
+            )
+
+        IndividualItem.objects.filter(pk__in=unit_ids).update(is_available=False)
+        ProjectItemUnit.objects.bulk_create([
+            ProjectItemUnit(projectitem_id=project_item.pk, individualitem_id=unit_id) for unit_id in unit_ids
+        ])
+        Item.change_available_quantity(project_item.item_id, -len(unit_ids))
+
+    return len(unit_ids)
+
+
+def release_units(project_item, quantity=None):
+    #returns units of the project item to stock, the newest `quantity` of them or all of them when quantity is None
+    #returns how many units were released
+    with transaction.atomic():
+        links = ProjectItemUnit.objects.filter(projectitem_id=project_item.pk)
+        if quantity is not None:
+            if quantity <= 0:
+                return 0
+            unit_ids = list(
+                project_item.individual_items.order_by('-itemCode').values_list('id', flat=True)[:quantity]
+            )
+            links = links.filter(individualitem_id__in=unit_ids)
+
+        released = IndividualItem.objects.filter(
+            pk__in=links.values('individualitem_id'), is_available=False
+        ).update(is_available=True)
+        links.delete()
+        Item.change_available_quantity(project_item.item_id, released)
+
+    return released
+
+
+def release_project_units(project):
+    #releases the units of every ProjectItem of the project at once, returns how many were released
+    with transaction.atomic():
+        links = ProjectItemUnit.objects.filter(projectitem__associated_project=project)
+        units = IndividualItem.objects.filter(pk__in=links.values('individualitem_id'), is_available=False)
+
+        released_per_item = dict(units.order_by().values('item').annotate(count=Count('pk')).values_list('item', 'count'))
+        released = units.update(is_available=True)
+        links.delete()
+
+        if released_per_item:
+            #one update for all items of the project instead of one per item
+            Item.objects.filter(pk__in=released_per_item).update(available_quantity=F('available_quantity') + Case(
+                *[When(pk=item_id, then=Value(count)) for item_id, count in released_per_item.items()],
+                output_field=PositiveIntegerField(),
+            ))
+            bump_versions('item')
+
+    return released
+
+
+def stamp_unit_prices(item_id, quantity, price, previous_prices):
+    #re-prices the units a purchase line produced in one UPDATE: they were inserted at the line's (previous) price with the
+    #newest codes at the time, so the newest `quantity` available units of the item still at one of those prices,
+    #older stock and other purchases' units keep their price, returns how many were updated
+    if quantity <= 0:
+        return 0
+    units = IndividualItem.objects.filter(item_id=item_id, is_available=True, price__in=previous_prices).order_by('-itemCode')
+    return IndividualItem.objects.filter(pk__in=units.values('pk')[:quantity]).update(price=price)
+
+
+@contextmanager
+def project_units_released(project):
+    #used by Project.delete: releases everything up front, then lets the cascade delete the ProjectItems without
+    #their pre_delete signal releasing again one ProjectItem at a time
+    with transaction.atomic():
+        release_project_units(project)
+        token = _released_projects.set(_released_projects.get() | {project.pk})
+        try:
+            yield
+        finally:
+            _released_projects.reset(token)
+
+
+def units_released_with_project(project_item):
+    return project_item.associated_project_id in _released_projects.get()
+
+
+def supplier_price_list(supplier_id):
+    #{item_id: price} of everything the supplier sells, loaded with one query and reused by every line validated afterwards
+    price_list = _supplier_price_lists.get(supplier_id)
+    if price_list is None:
+        generation = _price_list_generation
+        price_list = dict(SupplierItem.objects.filter(supplier_id=supplier_id).values_list('item_id', 'price'))
+        with _price_list_lock:
+            if generation == _price_list_generation:
+                _supplier_price_lists[supplier_id] = price_list
+    return price_list
+
+
+def forget_supplier_price_list(supplier_id=None):
+    #drops the cached price list of one supplier, or of all of them when supplier_id is None
+    global _price_list_generation
+    with _price_list_lock:
+        _price_list_generation += 1
+        if supplier_id is None:
+            _supplier_price_lists.clear()
+        else:
+            _supplier_price_lists.pop(supplier_id, None)
+
+
+@contextmanager
+def deferred_recompute():
+    #for bulk work (admin inlines, imports, data fixes): inside the block the receivers only record which categories, purchases
+    #and re-priced purchase lines changed, and each of them is recomputed once when the transaction commits
+    #usable as a decorator too, nested blocks are folded into the outermost one
+    if _deferred_recompute.get() is not None:
+        yield
+        return
+
+    dirty = defaultdict(set)
+    with transaction.atomic():
+        token = _deferred_recompute.set(dirty)
+        try:
+            yield
+        finally:
+            _deferred_recompute.reset(token)
+        transaction.on_commit(lambda: recompute_deferred(dirty))
+
+
+def defer_recompute(kind, *ids):
+    #records ids ('categories', 'purchases', or for 'purchase_lines' (id, previous price, previous quantity) tuples)
+    #for the enclosing deferred_recompute block
+    #returns False outside of one, the caller then applies its change right away as usual
+    dirty = _deferred_recompute.get()
+    if dirty is None:
+        return False
+    dirty[kind].update(pk for pk in ids if pk is not None)
+    return True
+
+
+def recompute_deferred(dirty):
+    with transaction.atomic():
+        if dirty['categories']:
+            Category.reconcile_quantities(Category.objects.filter(pk__in=dirty['categories']), fix=True)
+        if dirty['purchases']:
+            Purchase.reconcile_totals(Purchase.objects.filter(pk__in=dirty['purchases']), fix=True)
+        #each re-priced line stamped once with its final item, quantity and price, covering the units inserted at any of the
+        #prices it had during the block, no more of them than it ever held
+        previous = defaultdict(lambda: (set(), 0))
+        for line_id, previous_price, previous_quantity in dirty['purchase_lines']:
+            prices, quantity = previous[line_id]
+            previous[line_id] = (prices | {previous_price}, max(quantity, previous_quantity))
+        for line_id, item_id, quantity, price in PurchaseItem.objects.filter(pk__in=previous).values_list('pk', 'item_id', 'quantity', 'price'):
+            prices, previous_quantity = previous[line_id]
+            stamp_unit_prices(item_id, min(quantity, previous_quantity), price, prices)
@@ -1,14 +1,20 @@
 from django.db import transaction
 # from django.db import connection
 from django.db.models.signals import post_delete, post_save, pre_save, pre_delete, m2m_changed
-from django.db.models import Sum, F
 from django.db.utils import DatabaseError, IntegrityError
 from django.dispatch import receiver
-from math import ceil
+from django.core.signals import request_started
+from inventory_management.metrics import timed_signal
+from inventory.cache import MODEL_VERSIONS, bump_model_versions
+from inventory.notifications import notify, ensure_listener
 from inventory.models import *
+from inventory.services import allocate_units, release_units, units_released_with_project, stamp_unit_prices, forget_supplier_price_list, defer_recompute
 from django.core.exceptions import ValidationError
+import logging
 # from inventory_management.utils import api_response
 
+logger = logging.getLogger(__name__)
+
 ###################
 ###what what items in a category
 #a item sold by what what suppliers
@@ -17,36 +23,19 @@ from django.core.exceptions import ValidationError
 #json ma item lai name le represent garne instead of pk
 ###################
 
-#capturing old quantity of PurchaseItem
-@receiver(pre_save, sender=PurchaseItem)
-def capture_original_quantities(sender, instance, **kwargs):
-    #checking if old or new instances, only doing this for existing instances
-    if instance.pk:
-        try:
-            #storing original quantities for all items in purchase_items, filter: items filtered are of the same purchase as as purchase of current instance
-            purchase_items = PurchaseItem.objects.filter(purchase=instance.purchase)
-            
-            #dictionary to store original quantities
-            original_quantities = {}
-            for trans_item in purchase_items:
-                #storing quantity of current PurchaseItem
-                original_quantities[trans_item.pk] = trans_item.quantity
-            
-            #attaching to the instance as a temporary attribute
-            instance._original_quantities = original_quantities
-        except Exception as e:
-            instance._original_quantities = {}
+#@timed_signal adds the time spent in each receiver to the current request's metrics (inventory_management/metrics.py)
+
+#the old quantity and price of a PurchaseItem come from PurchaseItem.previous_values(), a snapshot of just this row
 
 
 ###here, instance is being used instead of self, as we're working with instance of Transcation and not of signal###
 @receiver([post_save, post_delete], sender=PurchaseItem)
+@timed_signal
 def update_purchase(sender, instance, created=None, **kwargs):
     try:
         with transaction.atomic(): #ensuring atomicity(so that all calculations are implemented at once and if error occurs, it's rolled back)
-            if hasattr(instance, 'purchase') and instance.purchase:
-                #first checking if the instance has attribute purchase, and secondly checking if the instance has a truthy value(meaning value exists and is not false, null, 0 or an empty string)
-                #hasattr is redundant remove later
-                purchase_instance = instance.purchase
+            if instance.purchase_id:
+                #checking the foreign key value directly, dereferencing instance.purchase would load the purchase just for this check
 
                 ####This is another approach but has a bottleneck for large datasets; memory inefficient####
                 # related_items = PurchaseItem.objects.filter(purchase=purchase_instance) #retreiving items that belong to current instance and is PurchaseItems' object
@@ -60,22 +49,25 @@ def update_purchase(sender, instance, created=None, **kwargs):
                 #     totalPrice = 0
                 #     finalPriceWithVat = 0
 
-                #retreiving items that belong to current instance and is PurchaseItems' object
-                #aggregating the total price directly in the database
-                result = PurchaseItem.objects.filter(purchase=purchase_instance).aggregate(
-                    total_price=Sum(F('quantity') * F('price')) #F allows you to reference model field values directly in database queries
-                    #aggregate --> basically means that the multiplication happens efficiently at the database level, avoiding the need to load the entire dataset into memory and perform the operation in Python
-                )
-                
-                #extracting the total price from the result dictionary (defaulting to 0 if there's no result)
-                totalPrice = result['total_price'] or 0
-                
-                # Calculate the final price with VAT
-                finalPriceWithVat = ceil(totalPrice * 1.13)
-
-                purchase_instance.totalPrice = totalPrice
-                purchase_instance.finalPriceWithVat = finalPriceWithVat
-                purchase_instance.save(update_fields=['totalPrice', 'finalPriceWithVat'])
+                #applying only the old-to-new change of this line to the purchase totals instead of re-summing every line,
+                #a full recompute is Purchase.reconcile_totals
+                line_total = instance.quantity * instance.price
+                previous = instance.previous_values() if created is False else None
+
+                if defer_recompute('purchases', instance.purchase_id, previous and previous['purchase_id']):
+                    pass #inside deferred_recompute, the purchase is recounted once on commit
+                elif kwargs.get('signal') == post_delete:
+                    Purchase.change_total(instance.purchase_id, -line_total)
+                elif created:
+                    Purchase.change_total(instance.purchase_id, line_total)
+                else:
+                    original_total = previous['quantity'] * previous['price']
+                    if previous['purchase_id'] == instance.purchase_id:
+                        Purchase.change_total(instance.purchase_id, line_total - original_total)
+                    else:
+                        #line moved to another purchase
+                        Purchase.change_total(previous['purchase_id'], -original_total)
+                        Purchase.change_total(instance.purchase_id, line_total)
 
     except DatabaseError as db_error:
         raise Exception(f"Error while updating purchase: {str(db_error)}")
@@ -84,88 +76,75 @@ def update_purchase(sender, instance, created=None, **kwargs):
 
     try:
         with transaction.atomic():
-            purchase_items = PurchaseItem.objects.filter(purchase=instance.purchase)
-
             if kwargs.get('signal') == post_save:   
                 if created:  #if the PurchaseItem is newly created, adding the quantity to the Item
                     print("Newly Created!")
 
-                    #updating quantity
-                    instance.item.itemQuantity += instance.quantity
-                    instance.item.save()
-
-                    #updating prices according to inputted price during PurchaseItem creation
-                    #filtering all individual items for this item, which matches the instance and is_available
-                    individual_items = IndividualItem.objects.filter(
-                        item=instance.item, 
-                        is_available=True
-                    ).order_by('itemCode')[:instance.quantity] #slicing to only the number of quantity the same as when creating PurchaseItem so as to not overload
-                    
-                    #updating prices for these individual items
-                    try:
-                        for ind_item in individual_items:
-                            ind_item.price = instance.price
-                            ind_item.save(update_fields=['price'])
-                    
-                    except Exception as e:
-                        print(f"Error updating individual item prices: {e}")
+                    #updating quantity, the individual items this creates are inserted with the purchase price already set
+                    #so no per unit price update is needed afterwards
+                    Item.add_quantity(instance.item_id, instance.quantity, unit_price=instance.price)
 
                 else:  #if the PurchaseItem is updated, getting the previous quantity before updating
                     print("Not Newly Created but updated!")
-                    #first, getting original quantity from pre_save
-                    original_quantities = getattr(instance, '_original_quantities', {}) #default is {} if no value
-
-                    for trans_item in purchase_items:
-                    #if item is being updated, calculate quantity difference
-                        if trans_item.pk == instance.pk:
-                            original_quantity = original_quantities.get(trans_item.pk, trans_item.quantity)
-                            #get(trans_item.pk, trans_item.quantity) 
-                            quantity_diff = instance.quantity - original_quantity
-                            
-                            #updating quantity
-                            trans_item.item.itemQuantity += quantity_diff
-                            trans_item.item.save()
-
-                            #updating prices according to inputted price during PurchaseItem creation
-                            #filtering all individual items for this item, which matches the instance and is_available
-                            individual_items = IndividualItem.objects.filter(
-                                item=trans_item.item, 
-                                is_available=True
-                            ).order_by('itemCode')[:instance.quantity]
-                            
-                            #updating prices for these individual items
-                            for ind_item in individual_items:
-                                ind_item.price = instance.price
-                                ind_item.save(update_fields=['price'])
-                        
-                        else:
-                            print("Wrong Instance")
+                    #first, getting original quantity and price of just this row
+                    previous = instance.previous_values()
+
+                    if previous['item_id'] == instance.item_id:
+                        quantity_diff = instance.quantity - previous['quantity']
+
+                        #updating quantity, added individual items get the new price on insert
+                        if quantity_diff:
+                            Item.add_quantity(instance.item_id, quantity_diff, unit_price=instance.price)
+                    else:
+                        #line now refers to another item, moving the whole quantity over
+                        Item.add_quantity(previous['item_id'], -previous['quantity'])
+                        Item.add_quantity(instance.item_id, instance.quantity, unit_price=instance.price)
+
+                    #re-pricing the units of this line in a single update instead of one save per unit, the ones it added just now
+                    #were already inserted at the new price, a line moved to another item only has new units
+                    if previous['price'] != instance.price and previous['item_id'] == instance.item_id and not defer_recompute(
+                        'purchase_lines', (instance.pk, previous['price'], previous['quantity'])
+                    ):
+                        stamp_unit_prices(
+                            instance.item_id, min(instance.quantity, previous['quantity']), instance.price, [previous['price']]
+                        )
 
             elif kwargs.get('signal') == post_delete:
                 print("Newly Deleted!")
                 #subtracting the quantity if a PurchaseItem is deleted
                     
-                instance.item.itemQuantity -= instance.quantity
-                instance.item.save()
+                Item.add_quantity(instance.item_id, -instance.quantity)
                 
     except Exception as e:
         raise Exception(f"Error while updating item quantity from purchase item: {e}")
 
 
 @receiver([post_save, post_delete], sender=Item)
+@timed_signal
 def update_category_on_quantity_and_delete_individual_items(sender, instance, created=None, **kwargs): 
     #created=None for handling both post_save and delete. For delete, it won't cause any problems by being none, and for save, it's automatically assigned
     try:
         with transaction.atomic():
-            #filtering items to be of the same category as of the current instance
-            filtered_items = Item.objects.filter(itemCategory=instance.itemCategory) 
-            #itemCategory=instance just doing this will cause a ValueError as itemCategory=instance means you're trying to filter by exact value the current instance has, e.g., "Raspberry Pi", instead of the category of said item
-            #summing at the database level
-            aggregated_result = filtered_items.aggregate(Sum('itemQuantity'))
-            #aggregate returns a dict, and total quantity is in key - itemQuantity__sum, but when filtering it could be empty so to handle None, else condition has a fallback to 0
-            total_quantity = aggregated_result['itemQuantity__sum'] if aggregated_result['itemQuantity__sum'] is not None else 0
-            #updating categoryQuantity to calculated quantity
-            Category.objects.filter(pk=instance.itemCategory.pk).update(categoryQuantity=total_quantity)
+            #applying only the change of this item to the category total, a full recompute is Category.reconcile_quantities
+            previous = instance.previous_values() if created is False else None
+
+            if defer_recompute('categories', instance.itemCategory_id, previous and previous['itemCategory_id']):
+                pass #inside deferred_recompute, the categories are recounted once on commit
+            elif kwargs.get('signal') == post_delete:
+                Category.change_quantity(instance.itemCategory_id, -instance.itemQuantity)
+            elif created:
+                Category.change_quantity(instance.itemCategory_id, instance.itemQuantity)
+            elif previous is not None:
+                #Item.save records the quantity and category the row had before this save
+                if previous['itemCategory_id'] == instance.itemCategory_id:
+                    Category.change_quantity(instance.itemCategory_id, instance.itemQuantity - previous['itemQuantity'])
+                else:
+                    #item moved to another category, taking its old quantity out of the old one
+                    Category.change_quantity(previous['itemCategory_id'], -previous['itemQuantity'])
+                    Category.change_quantity(instance.itemCategory_id, instance.itemQuantity)
+            else:
+                #no record of the previous state, falling back to recounting this category
+                Category.reconcile_quantities(Category.objects.filter(pk=instance.itemCategory_id), fix=True)
             
             if created is None:
                 instance.individual_items.all().delete()
@@ -174,6 +153,7 @@ def update_category_on_quantity_and_delete_individual_items(sender, instance, cr
 
         
 @receiver(pre_delete, sender=Purchase)
+@timed_signal
 def update_purchase_on_purchaseitem_delete(sender, instance, **kwargs):
     try:
         items_in_deleted_purchase = PurchaseItem.objects.filter(purchase=instance) #here, purchase=instance and not purchase=instance.purchase as the sender is purchase itself and it most likely doesn't have field referring to itself (unless there is)
@@ -188,6 +168,7 @@ def update_purchase_on_purchaseitem_delete(sender, instance, **kwargs):
 
 
 @receiver(post_delete, sender=Purchase)
+@timed_signal
 def delete_purchaseitems_when_purchase_delete(sender, instance, **kwargs):
     try:
         with transaction.atomic():
@@ -197,7 +178,42 @@ def delete_purchaseitems_when_purchase_delete(sender, instance, **kwargs):
         raise Exception(f"Couldn't delete Purchase Items when deleting Transacation: {e}")
 
 
+@timed_signal
+def bump_cached_list_versions(sender, **kwargs):
+    #a saved or deleted row makes the cached lists showing its model stale (inventory/cache.py)
+    bump_model_versions(sender)
+
+#connected only for the models shown in cached lists, a post_delete receiver without a sender would match every model
+#and turn off the collector's fast deletes everywhere (eg: the bulk unit releases in services.py)
+for label in MODEL_VERSIONS:
+    post_save.connect(bump_cached_list_versions, sender=label)
+    post_delete.connect(bump_cached_list_versions, sender=label)
+
+
+@receiver([post_save, post_delete], sender=SupplierItem)
+@timed_signal
+def invalidate_supplier_price_list(sender, instance, **kwargs):
+    #dropping every cached list, an edit may have moved the row from one supplier to another
+    #supplier prices change rarely, the next validation just reloads them
+    #dropped now for the rest of this transaction, and again once it commits: until then another request of this process
+    #still reads the old prices and may have cached them again, the listener ignores this process' own notifications
+    #queryset .update() and bulk_create on SupplierItem send no signals and skip all of this, call forget_supplier_price_list()
+    #and notify('price_lists') after them
+    forget_supplier_price_list()
+    transaction.on_commit(forget_supplier_price_list)
+    notify('price_lists') #the other workers drop theirs once this transaction commits
+
+
+@receiver(request_started)
+def reset_supplier_price_lists(sender, **kwargs):
+    #with this worker's change listener running (postgres), other workers' supplier changes arrive as notifications and the
+    #price lists are kept across requests, otherwise they are only reused within a request
+    if not ensure_listener():
+        forget_supplier_price_list()
+
+
 @receiver(pre_save, sender=SupplierItem)
+@timed_signal
 def validate_supplier_item(sender, instance, **kwargs):
     #checking if this supplier already has this item
     existing_item = SupplierItem.objects.filter(
@@ -209,87 +225,49 @@ def validate_supplier_item(sender, instance, **kwargs):
         raise ValidationError(f"Supplier {instance.supplier.supplierName} already sells {instance.item.itemName}.")
 
     
-@receiver(post_delete, sender=Project)
-def delete_projectitems_when_project_delete(sender, instance, **kwargs):
-    try:
-        with transaction.atomic():
-            project_items = instance.project_item_project.all()
-            project_items.delete()
-
-            #changing selected individual items to available if deleted
-            try:
-                individual_items_to_update = IndividualItem.objects.filter(
-                    project_item_item_code__in=project_items
-                )
-                individual_items_to_update.update(is_available=True)
-            except Exception as e:
-                    raise Exception(f"Couldn't update availability after deletion of Project Item from Project: {e}")
-            print("below is_available=True")
-
-    except Exception as e:
-        raise Exception(f"Couldn't delete Project Items when deleting Project: {e}")
-
-
 @receiver(pre_delete, sender=ProjectItem)
+@timed_signal
 def handle_deletion_of_projectitems(sender, instance, **kwargs):
+    #the whole project is being deleted and Project.delete already released its units
+    if units_released_with_project(instance):
+        return
+
     try:
         with transaction.atomic():
-            print("inside post_delete of projectitem")
-
-            individual_items = instance.individual_items.all()
-            if individual_items.exists():
-                print(f"Individual items related: {individual_items}")
-                for item in individual_items:
-                    item.is_available = True
-                    item.save()  # This saves the item with availability set to True
-                    print(f"Item {item.itemCode} set to available.")
-            else:
-                print("No individual items found.")
+            #one update plus one m2m delete however many units the project item holds
+            released_count = release_units(instance)
+            logger.debug("%s individual items set to available.", released_count)
     except Exception as e:
         print(f"Error in post_delete signal: {e}")
         raise Exception(f"Couldn't change availability after deletion of Project Item: {e}")
 
 
 @receiver(pre_save, sender=ProjectItem)
+@timed_signal
 def validate_item_availability(sender, instance, *args, **kwargs):
     #skipping validation if its is a deletion
     if instance.quantity == 0:
         return
         
-    with transaction.atomic():
-        #getting currently assigned items for existing instances
-        currently_assigned = set()
-        if instance.pk:
-            currently_assigned = set(
-                instance.individual_items.values_list('id', flat=True)
-            )
-            
-        #calculating how many additional items we need
-        available_items = instance.item.individual_items.filter(
-            is_available=True
-        ).exclude(
-            id__in=currently_assigned
-        )
-        available_count = available_items.count()
+    #cheap early check against the stored counters for a readable error, allocate_units re-checks under row locks
+    previous = instance.previous_values()
+    currently_assigned = previous['quantity'] if previous else 0
+    additional_needed = instance.quantity - currently_assigned
+    
+    available_count = Item.objects.filter(pk=instance.item_id).values_list('available_quantity', flat=True).first() or 0
         
-        #for updates, we need to check if we're increasing or decreasing quantity
-        if instance.pk:
-            original = ProjectItem.objects.get(pk=instance.pk)
-            additional_needed = instance.quantity - original.quantity
-        else:
-            additional_needed = instance.quantity
-            
-        if additional_needed > available_count:
-            curr_total = available_count + len(currently_assigned)
-            raise ValidationError(
-                f'Not enough available items. Requested: {instance.quantity}, '
-                f'Currently assigned: {len(currently_assigned)}, '
-                f'Additional available: {available_count}, '
-                f'Total available: {curr_total}'
-            )
+    if additional_needed > available_count:
+        curr_total = available_count + currently_assigned
+        raise ValidationError(
+            f'Not enough available items. Requested: {instance.quantity}, '
+            f'Currently assigned: {currently_assigned}, '
+            f'Additional available: {available_count}, '
+            f'Total available: {curr_total}'
+        )
 
 
 @receiver(post_save, sender=ProjectItem)
+@timed_signal
 def manage_individual_items(sender, instance, created, **kwargs):
     with transaction.atomic():
         if created:
@@ -301,14 +279,7 @@ def manage_individual_items(sender, instance, created, **kwargs):
 
 
 def assign_new_items(instance):
-    available_items = instance.item.individual_items.filter(
-        is_available=True
-    ).order_by('itemCode')[:instance.quantity]
-    
-    for item in available_items:
-        item.is_available = False
-        item.save()
-        instance.individual_items.add(item)
+    allocate_units(instance, instance.quantity)
 
 
 def update_assigned_items(instance):
@@ -316,24 +287,11 @@ def update_assigned_items(instance):
     
     if instance.quantity > current_count:
         #if needed to add more items
-        additional_needed = instance.quantity - current_count
-        new_items = instance.item.individual_items.filter(
-            is_available=True
-        ).order_by('itemCode')[:additional_needed]
-        
-        for item in new_items:
-            item.is_available = False
-            item.save()
-            instance.individual_items.add(item)
+        allocate_units(instance, instance.quantity - current_count)
             
     elif instance.quantity < current_count:
-        #if needed to remove some items
-        items_to_remove = instance.individual_items.order_by('-itemCode')[:current_count - instance.quantity]
-        
-        for item in items_to_remove:
-            item.is_available = True
-            item.save()
-            instance.individual_items.remove(item)
+        #if needed to remove some items, newest codes first
+        release_units(instance, current_count - instance.quantity)
 
 
 #
\ No newline at end of file
@@ -1,26 +1,503 @@
-def my_decorator(func):
-    def wrapper():
-        print(f"Running {func.__name__}")
-        func()
-        print("Completed.")
-    return wrapper
+import threading
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from inventory.models import (
+    Category, Item, IndividualItem, ItemCodeCounter, Supplier, SupplierItem, Purchase, PurchaseItem, Project, ProjectItem,
+    close_reservation_connection,
+)
+from inventory.serializers import (
+    read_values, ItemSerializer, IndividualItemSerializer, SupplierSerializer, PurchaseSerializer, PurchaseItemSerializer,
+    ProjectSerializer, ProjectItemSerializer,
+)
+from inventory.services import ProjectItemUnit, deferred_recompute
+from inventory_management.renderers import dumps
 
-@my_decorator
-def do_this():
-    print("Doing this.")
+#invariants of the stored counters (available_quantity, categoryQuantity, purchase totals) and the query counts the bulk paths
+#and the list reads promise, run with: python manage.py test inventory
 
-@my_decorator
-def do_that():
-    print("Doing that.")
+#no LISTEN/NOTIFY listener under test: its startup eviction would bump the list versions in the middle of a test
+#code blocks reserved in the test transaction, so they roll back with it and every test sees the same codes
+@override_settings(INVENTORY_NOTIFY=False, ITEM_CODE_AUTOCOMMIT=False)
+class InventoryTestCase(TestCase):
+    def setUp(self):
+        cache.clear() #list cache and its version counters live outside the test database
+        self.category = Category.objects.create(categoryName='Boards')
 
-# do_this()
-# do_that()
+    def create_item(self, quantity, name='Raspberry'):
+        return Item.objects.create(itemName=name, itemQuantity=quantity, itemCategory=self.category)
 
-def add_numbers(*args):
-    total = 0
-    for num in args:
-        total+=num
+    def assertCountersInSync(self):
+        self.assertEqual(Item.reconcile_available_quantity(), {})
+        self.assertEqual(Category.reconcile_quantities(), {})
+        self.assertEqual(Purchase.reconcile_totals(), {})
 
-    print("Sum is:", total)
+class UnitShrinkTests(InventoryTestCase):
+    def test_shrink_deletes_newest_available_units(self):
+        item = self.create_item(50)
+        item.itemQuantity = 20
+        item.save()
 
-add_numbers(1,2,3,4,5,6,7,8,9,10)
\ No newline at end of file
+        codes = list(IndividualItem.objects.filter(item=item).order_by('itemCode').values_list('itemCode', flat=True))
+        self.assertEqual(len(codes), 20)
+        self.assertEqual(codes[-1], 'RA0020')
+        self.assertEqual(item.removed_units, 30)
+        item.refresh_from_db()
+        self.assertEqual(item.available_quantity, 20)
+        self.assertCountersInSync()
+
+    def test_shrink_below_available_units_rolls_back(self):
+        item = self.create_item(10)
+        project = Project.objects.create(projectName='Rover', projectLeader='Asha')
+        ProjectItem.objects.create(associated_project=project, item=item, quantity=8)
+
+        item.refresh_from_db()
+        item.itemQuantity = 1
+        with self.assertRaises(ValueError):
+            item.save()
+
+        item.refresh_from_db()
+        self.assertEqual(item.itemQuantity, 10)
+        self.assertEqual(IndividualItem.objects.filter(item=item).count(), 10)
+        self.assertCountersInSync()
+
+    def test_shrink_runs_the_same_queries_for_any_number_of_units(self):
+        def shrink_queries(quantity, name):
+            item = self.create_item(quantity, name)
+            item.itemQuantity = 0
+            with CaptureQueriesContext(connection) as queries:
+                item.save()
+            return len(queries)
+
+        self.assertEqual(shrink_queries(10, 'Arduino'), shrink_queries(2000, 'Breadboard'))
+
+class ItemCodeTests(InventoryTestCase):
+    def test_counter_starts_after_codes_of_its_own_prefix_only(self):
+        #codes generated before counters existed: R0003 and RA12345 are R's, RA9999 and RAA10000 belong to the RA prefix
+        legacy_codes = {'R0003', 'RA12345', 'RA9999', 'RAA10000'}
+        item = self.create_item(0, 'R')
+        IndividualItem.objects.bulk_create(IndividualItem(item=item, itemCode=code) for code in legacy_codes)
+        ItemCodeCounter.objects.filter(prefix='R').delete()
+        self.assertEqual(ItemCodeCounter._last_used_number('R'), 12345)
+
+        item.itemQuantity = 2
+        item.save()
+        codes = set(IndividualItem.objects.filter(item=item).values_list('itemCode', flat=True))
+        self.assertEqual(codes - legacy_codes, {'RA12346', 'RA12347'})
+
+@skipUnless(connection.vendor == 'postgresql', "blocks are only reserved outside the transaction on postgresql")
+@override_settings(INVENTORY_NOTIFY=False, ITEM_CODE_AUTOCOMMIT=True)
+class ItemCodeReservationTests(TransactionTestCase):
+    def tearDown(self):
+        close_reservation_connection() #an open connection keeps the test database from being dropped
+
+    def test_block_is_reserved_outside_the_callers_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                first = ItemCodeCounter.reserve('ZZ', 5)
+                #the counter row isn't held by this transaction, another worker reserves right away
+                other = []
+                worker = threading.Thread(target=lambda: (other.append(ItemCodeCounter.reserve('ZZ', 2)), connections.close_all()))
+                worker.start()
+                worker.join(timeout=10)
+                self.assertEqual(other, [first + 5])
+                raise RuntimeError
+
+        #the rolled back block is a gap, never handed out again
+        self.assertEqual(ItemCodeCounter.reserve('ZZ', 1), first + 7)
+
+class AllocationTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = self.create_item(30)
+        self.project = Project.objects.create(projectName='Rover', projectLeader='Asha')
+
+    def test_allocate_resize_and_release(self):
+        project_item = ProjectItem.objects.create(associated_project=self.project, item=self.item, quantity=12)
+        self.assertEqual(project_item.individual_items.count(), 12)
+        self.assertFalse(project_item.individual_items.filter(is_available=True).exists())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.available_quantity, 18)
+
+        project_item.quantity = 5
+        project_item.save()
+        self.assertEqual(project_item.individual_items.count(), 5)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.available_quantity, 25)
+
+        project_item.delete()
+        self.assertFalse(ProjectItemUnit.objects.exists())
+        self.assertEqual(IndividualItem.objects.filter(is_available=True).count(), 30)
+        self.assertCountersInSync()
+
+    def test_allocation_over_available_units_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            ProjectItem.objects.create(associated_project=self.project, item=self.item, quantity=31)
+        self.assertFalse(ProjectItemUnit.objects.exists())
+        self.assertCountersInSync()
+
+    def test_project_delete_releases_in_constant_queries(self):
+        def delete_queries(quantity, name):
+            item = self.create_item(quantity, name)
+            project = Project.objects.create(projectName=name, projectLeader='Asha')
+            ProjectItem.objects.create(associated_project=project, item=item, quantity=quantity)
+            with CaptureQueriesContext(connection) as queries:
+                project.delete()
+            return len(queries)
+
+        self.assertEqual(delete_queries(10, 'Arduino'), delete_queries(1500, 'Breadboard'))
+        self.assertFalse(IndividualItem.objects.filter(is_available=False).exists())
+        self.assertCountersInSync()
+
+class PurchaseTestCase(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = self.create_item(5)
+        self.other_item = self.create_item(5, 'Sensor')
+        self.supplier = Supplier.objects.create(supplierName='Himalayan Parts', address='Kathmandu', contactNo='9800000000')
+        SupplierItem.objects.create(supplier=self.supplier, item=self.item, price=100)
+        SupplierItem.objects.create(supplier=self.supplier, item=self.other_item, price=40)
+        self.purchase = Purchase.objects.create(billNo='B-1', supplier=self.supplier)
+
+    def add_line(self, item, quantity, price):
+        return PurchaseItem.objects.create(purchase=self.purchase, item=item, category=self.category, quantity=quantity, price=price)
+
+class PurchaseTotalTests(PurchaseTestCase):
+    def test_totals_follow_line_changes(self):
+        line = self.add_line(self.item, 3, 100)
+        self.add_line(self.other_item, 2, 40)
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.totalPrice, 380)
+        self.assertEqual(self.purchase.finalPriceWithVat, 430) #ceil(380 * 1.13)
+
+        line.quantity = 1
+        line.save()
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.totalPrice, 180)
+
+        line.delete()
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.totalPrice, 80)
+        self.other_item.refresh_from_db()
+        self.assertEqual(self.other_item.itemQuantity, 7) #purchased units are added to stock
+        self.assertCountersInSync()
+
+    def test_price_edit_reprices_only_the_lines_units(self):
+        #RA0001-RA0005 are older stock at price 0, the line inserts RA0006-RA0008 at its price
+        line = self.add_line(self.item, 3, 100)
+        supplier_item = SupplierItem.objects.get(supplier=self.supplier, item=self.item)
+        supplier_item.price = 150
+        supplier_item.save()
+        line.price = 150
+        line.quantity = 4 #the added unit is inserted at the new price
+        line.save()
+
+        prices = dict(IndividualItem.objects.filter(item=self.item).values_list('itemCode', 'price'))
+        self.assertEqual([prices[f"RA000{number}"] for number in range(1, 6)], [0] * 5)
+        self.assertEqual([prices[f"RA000{number}"] for number in range(6, 10)], [150] * 4)
+        self.assertCountersInSync()
+
+class DeferredRecomputeTests(PurchaseTestCase):
+    #inside a deferred_recompute block the receivers only record what changed, totals and category counts are recomputed
+    #once when the transaction commits
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+
+    def recompute_calls(self):
+        #(reconcile_totals, reconcile_quantities) call counters, only the deferred recompute calls them on these paths
+        return (
+            mock.patch.object(Purchase, 'reconcile_totals', wraps=Purchase.reconcile_totals),
+            mock.patch.object(Category, 'reconcile_quantities', wraps=Category.reconcile_quantities),
+        )
+
+    def test_block_recomputes_once_on_commit(self):
+        supplier_item = SupplierItem.objects.get(supplier=self.supplier, item=self.item)
+        totals_patch, quantities_patch = self.recompute_calls()
+        with totals_patch as reconcile_totals, quantities_patch as reconcile_quantities:
+            with self.captureOnCommitCallbacks(execute=True):
+                with deferred_recompute():
+                    line = self.add_line(self.item, 3, 100)
+                    self.add_line(self.other_item, 2, 40)
+                    self.add_line(self.item, 1, 100)
+                    line.quantity = 4
+                    line.save()
+                    supplier_item.price = 120
+                    supplier_item.save()
+                    line.price = 120
+                    line.save()
+                    self.other_item.refresh_from_db()
+                    self.other_item.itemQuantity = 9
+                    self.other_item.save()
+
+                    self.purchase.refresh_from_db()
+                    self.assertFalse(self.purchase.totalPrice) #nothing recomputed yet
+            self.assertEqual(reconcile_totals.call_count, 1)
+            self.assertEqual(reconcile_quantities.call_count, 1)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.totalPrice, 4 * 120 + 2 * 40 + 100)
+        self.assertEqual(IndividualItem.objects.filter(item=self.item, price=120).count(), 4)
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.categoryQuantity, 10 + 9) #5 + 5 purchased units, Sensor set to 9
+        self.assertCountersInSync()
+
+    def test_admin_bill_save_and_delete_recompute_once(self):
+        lines = [(self.item, 3, 100), (self.other_item, 2, 40), (self.item, 1, 100)]
+        #through the change view, PurchaseItem.clean needs the bill to exist already
+        data = {
+            'billNo': 'B-1',
+            'supplier': self.supplier.pk,
+            'paymentStatus': 'Pending',
+            'purchaseitem_purchase-TOTAL_FORMS': len(lines),
+            'purchaseitem_purchase-INITIAL_FORMS': 0,
+        }
+        for index, (item, quantity, price) in enumerate(lines):
+            data.update({
+                f'purchaseitem_purchase-{index}-item': item.pk,
+                f'purchaseitem_purchase-{index}-category': self.category.pk,
+                f'purchaseitem_purchase-{index}-quantity': quantity,
+                f'purchaseitem_purchase-{index}-price': price,
+            })
+
+        totals_patch, quantities_patch = self.recompute_calls()
+        with totals_patch as reconcile_totals, quantities_patch as reconcile_quantities:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/admin/inventory/purchase/{self.purchase.pk}/change/', data)
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual((reconcile_totals.call_count, reconcile_quantities.call_count), (1, 1))
+            self.purchase.refresh_from_db()
+            self.assertEqual(self.purchase.totalPrice, 480)
+            self.assertCountersInSync()
+            reconcile_quantities.reset_mock() #assertCountersInSync calls it too
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/admin/inventory/purchase/', {
+                    'action': 'delete_selected', '_selected_action': [self.purchase.pk], 'post': 'yes',
+                })
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(reconcile_quantities.call_count, 1)
+        self.assertFalse(Purchase.objects.exists())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.itemQuantity, 5)
+        self.assertCountersInSync()
+
+    def test_admin_item_delete_recounts_categories_once(self):
+        _, quantities_patch = self.recompute_calls()
+        SupplierItem.objects.all().delete()
+        self.purchase.delete()
+        with quantities_patch as reconcile_quantities:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/admin/inventory/item/', {
+                    'action': 'delete_selected', '_selected_action': [self.item.pk, self.other_item.pk], 'post': 'yes',
+                })
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(reconcile_quantities.call_count, 1)
+        self.assertFalse(Item.objects.exists())
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.categoryQuantity, 0)
+        self.assertCountersInSync()
+
+class PurchaseBillTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = self.create_item(5)
+        self.other_item = self.create_item(5, 'Sensor')
+        self.other_category = Category.objects.create(categoryName='Modules')
+        self.module = Item.objects.create(itemName='Relay', itemQuantity=0, itemCategory=self.other_category)
+        self.supplier = Supplier.objects.create(supplierName='Himalayan Parts', address='Kathmandu', contactNo='9800000000')
+        for item, price in [(self.item, 100), (self.other_item, 40), (self.module, 25)]:
+            SupplierItem.objects.create(supplier=self.supplier, item=item, price=price)
+
+    def post_bill(self, bill_no, lines):
+        #lines are (item, quantity, price) or (item, quantity, price, category id) to send another category than the item's
+        return self.client.post('/api/purchase/bulk/', {
+            'billNo': bill_no,
+            'supplier': self.supplier.pk,
+            'purchaseitem_purchase': [{
+                'item': line[0].pk,
+                'category': line[3] if len(line) > 3 else line[0].itemCategory_id,
+                'quantity': line[1],
+                'price': line[2],
+            } for line in lines],
+        }, content_type='application/json').json()
+
+    def test_bill_repeating_an_item_keeps_counters_in_sync(self):
+        response = self.post_bill('B-1', [(self.item, 3, 100), (self.module, 4, 25), (self.item, 2, 100)])
+        self.assertTrue(response['IsSuccess'], response['ErrorMessage'])
+        self.assertEqual(len(response['Result']['purchaseitem_purchase']), 3)
+
+        purchase = Purchase.objects.get(billNo='B-1')
+        self.assertEqual(purchase.totalPrice, 600)
+        self.assertEqual(purchase.finalPriceWithVat, 678) #ceil(600 * 1.13)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.itemQuantity, self.item.available_quantity), (10, 10))
+        self.assertEqual(IndividualItem.objects.filter(item=self.item, price=100).count(), 5)
+        self.assertEqual(IndividualItem.objects.filter(item=self.module).count(), 4)
+        self.category.refresh_from_db()
+        self.other_category.refresh_from_db()
+        self.assertEqual((self.category.categoryQuantity, self.other_category.categoryQuantity), (15, 4))
+        self.assertCountersInSync()
+
+    def test_invalid_lines_are_reported_by_position_and_nothing_is_written(self):
+        stranger = self.create_item(0, 'Motor') #not sold by the supplier
+        response = self.post_bill('B-1', [
+            (self.item, 3, 100),
+            (self.other_item, 1, 45), #wrong price
+            (stranger, 1, 10),
+            (self.module, 1, 25, self.category.pk), #wrong category
+        ])
+        self.assertFalse(response['IsSuccess'])
+        self.assertEqual(response['StatusCode'], 400)
+        errors = response['ErrorMessage']['purchaseitem_purchase']
+        self.assertEqual({position: set(line_errors) for position, line_errors in errors.items()}, {
+            '1': {'price'}, '2': {'item'}, '3': {'category'},
+        })
+
+        self.assertFalse(Purchase.objects.exists())
+        self.assertFalse(PurchaseItem.objects.exists())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.itemQuantity, 5)
+        self.assertCountersInSync()
+
+    def test_bill_runs_the_same_queries_for_any_number_of_lines(self):
+        def bill_queries(bill_no, repeat):
+            lines = [(self.item, 1, 100), (self.other_item, 2, 40), (self.module, 1, 25)] * repeat
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.post_bill(bill_no, lines)['IsSuccess'])
+            return len(queries)
+
+        self.assertEqual(bill_queries('B-1', 1), bill_queries('B-2', 50))
+        self.assertEqual(Purchase.objects.get(billNo='B-2').totalPrice, 50 * 205)
+        self.assertCountersInSync()
+
+class ReadValuesTests(InventoryTestCase):
+    #the list GETs answer with read_values rows, they have to render exactly like the serializer they stand in for
+    def setUp(self):
+        super().setUp()
+        item = self.create_item(4)
+        supplier = Supplier.objects.create(supplierName='Himalayan Parts', address='Kathmandu', contactNo='9800000000')
+        SupplierItem.objects.create(supplier=supplier, item=item, price=100)
+        purchase = Purchase.objects.create(billNo='B-1', supplier=supplier)
+        PurchaseItem.objects.create(purchase=purchase, item=item, category=self.category, quantity=2, price=100)
+        project = Project.objects.create(projectName='Rover', projectLeader='Asha')
+        ProjectItem.objects.create(associated_project=project, item=item, quantity=3)
+
+    def test_rows_render_like_the_serializers(self):
+        lists = [
+            (Item.objects.all(), ItemSerializer, None),
+            (IndividualItem.objects.all(), IndividualItemSerializer, None),
+            (PurchaseItem.objects.all(), PurchaseItemSerializer, None),
+            (ProjectItem.objects.all(), ProjectItemSerializer, None),
+            #lists served without their nested rows
+            (Supplier.objects.all(), SupplierSerializer, 'supplieritem_supplier'),
+            (Purchase.objects.all(), PurchaseSerializer, 'purchaseitem_purchase'),
+            (Project.objects.all(), ProjectSerializer, 'project_item_project'),
+        ]
+        for queryset, serializer_class, nested in lists:
+            with self.subTest(serializer_class.__name__):
+                fields = [field for field in serializer_class.Meta.fields if field != nested]
+                serialized = [
+                    {field: value for field, value in row.items() if field != nested}
+                    for row in serializer_class(queryset.order_by('id'), many=True).data
+                ]
+                rows = list(read_values(queryset.order_by('id'), fields))
+                self.assertTrue(rows)
+                self.assertEqual(rows, serialized)
+                self.assertEqual(dumps(rows), dumps(serialized))
+
+class ListReadTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = self.create_item(3)
+
+    def test_matching_etag_gets_304_without_queries(self):
+        response = self.client.get('/api/item/')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/item/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get('/api/item/')['ETag']
+
+        #versions are bumped on commit, which a TestCase otherwise never reaches
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.itemQuantity = 5
+            self.item.save()
+
+        response = self.client.get('/api/item/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['Result'][0]['itemQuantity'], 5)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_list_reads_stay_within_query_budgets(self):
+        project = Project.objects.create(projectName='Rover', projectLeader='Asha')
+        for number in range(20):
+            item = self.create_item(2, f"Part {number}")
+            ProjectItem.objects.create(associated_project=project, item=item, quantity=1)
+        supplier = Supplier.objects.create(supplierName='Himalayan Parts', address='Kathmandu', contactNo='9800000000')
+        SupplierItem.objects.create(supplier=supplier, item=self.item, price=10)
+        for number in range(20):
+            PurchaseItem.objects.create(
+                purchase=Purchase.objects.create(billNo=f"B-{number}", supplier=supplier),
+                item=self.item, category=self.category, quantity=1, price=10,
+            )
+
+        for number in range(20):
+            SupplierItem.objects.create(
+                supplier=Supplier.objects.create(supplierName=f"Supplier {number}", address='Pokhara', contactNo='9800000001'),
+                item=self.item, price=10,
+            )
+
+        for url in ['/api/item/', '/api/category/', '/api/individual_item/', '/api/purchase/', '/api/project/', '/api/supplier/']:
+            cache.clear() #measuring the uncached read
+            for query in ['', '?page_size=5']:
+                response = self.client.get(url + query) #QueryBudgetExceeded fails the test
+                self.assertTrue(response.json()['IsSuccess'], url)
+
+        #one query per page whatever the number of rows, the nested lines and supplier items are not loaded for the lists
+        for url in ['/api/purchase/?page_size=20', '/api/supplier/?page_size=20']:
+            cache.clear()
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertNotIn('supplieritem_supplier', response.json()['Result']['Results'][0])
+
+
+@skipUnless(connection.vendor == 'postgresql', "the plan rules are written for the postgresql planner")
+class HotQueryPlanTests(InventoryTestCase):
+    #the IndividualItem availability paths have to be served by individualitem_available_idx (or the unique code index)
+    #in index order, never by a full scan or a separate sort, whatever the table size
+    def test_hot_queries_are_index_driven(self):
+        item = self.create_item(50)
+        available = IndividualItem.objects.filter(item_id=item.pk, is_available=True)
+        hot_queries = {
+            #allocate_units picking the oldest units
+            'allocation pick': available.order_by('itemCode').values_list('id', flat=True)[:100],
+            #Item._remove_individual_codes picking the newest units to delete
+            'shrink pick': available.order_by('-itemCode').values_list('id', flat=True)[:100],
+            #stamp_unit_prices picking the newest units of a purchase line
+            'price stamping': available.filter(price__in=[0]).order_by('-itemCode').values_list('id', flat=True)[:100],
+            #available count used by reconcile_available_quantity
+            'available count': available.values_list('id', flat=True),
+            #exact code lookup
+            'code lookup': IndividualItem.objects.filter(itemCode='RA0010'),
+        }
+
+        with connection.cursor() as cursor:
+            #a test sized table makes a seq scan the cheapest plan, this shows whether an index *can* serve the query
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, queryset in hot_queries.items():
+            plan = queryset.explain()
+            with self.subTest(name, plan=plan):
+                self.assertNotIn('Seq Scan', plan)
+                self.assertNotIn('Sort', plan)
+                self.assertIn('Index', plan)
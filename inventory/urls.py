@@ -8,6 +8,7 @@ urlpatterns = [
     path('supplier/', SupplierAPIView.as_view(), name='supllier_list'),
     path('supplier/<int:id>/', SupplierItemAPIView.as_view(), name='supllier_detail'),
     path('purchase/', PurchaseAPIView.as_view(), name='purchase_list'),
+    path('purchase/bulk/', PurchaseBillAPIView.as_view(), name='purchase_bulk'), #whole bill (header + lines) in one request
     path('purchase/<int:id>/', PurchaseItemAPIView.as_view(), name='purchase_detail'),
     path('project/', ProjectAPIView.as_view(), name='project_list'),
     path('project/<int:id>/', ProjectItemAPIView.as_view(), name='project_detail'),
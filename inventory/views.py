@@ -1,23 +1,27 @@
 from django.shortcuts import get_object_or_404
-from inventory_management.utils import api_response
+from inventory_management.utils import api_response, paginate_queryset, paginated_result, stream_requested, stream_response
 
 from inventory.models import *
 from inventory.serializers import *
+from inventory.cache import cached_list
 
 from rest_framework import status
 from rest_framework.views import APIView
 
 #available q cant be greater than item exception
 class ItemAPIView(APIView):
+    @cached_list('item')
     def get(self, request, *args, **kwargs):
         try:
-            items = Item.objects.all()
-            item_serializer = ItemSerializer(items, many=True)
+            if stream_requested(request):
+                return stream_response(request, Item.objects.all(), ItemSerializer.Meta.fields)
+
+            items, paginator = paginate_queryset(request, read_values(Item.objects.all(), ItemSerializer.Meta.fields), self)
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result = item_serializer.data,
+                result = paginated_result(list(items), paginator),
             )
             
         except Item.DoesNotExist:
@@ -147,15 +151,19 @@ class ItemAPIView(APIView):
             )
 
 class CategoryAPIView(APIView):
+    @cached_list('category')
     def get(self, request, *args, **kwargs):
         try:
-            categories = Category.objects.all()
+            if stream_requested(request):
+                return stream_response(request, Category.objects.all(), CategorySerializer.Meta.fields)
+
+            categories, paginator = paginate_queryset(request, Category.objects.all(), self)
             category_serializer = CategorySerializer(categories, many=True)
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result=category_serializer.data,
+                result=paginated_result(category_serializer.data, paginator),
             )
             
         except Category.DoesNotExist:
@@ -287,13 +295,18 @@ class CategoryAPIView(APIView):
 class IndividualItemAPIView(APIView):
     def get(self, request, *args, **kwargs):
         try:
-            individual_items = IndividualItem.objects.all()
-            individual_item_serializer = IndividualItemSerializer(individual_items, many=True)
+            if stream_requested(request):
+                #?stream=ndjson or ?stream=json writes rows out as they are read instead of building the whole list in memory
+                return stream_response(request, IndividualItem.objects.all(), IndividualItemSerializer.Meta.fields)
+
+            individual_items, paginator = paginate_queryset(
+                request, read_values(IndividualItem.objects.all(), IndividualItemSerializer.Meta.fields), self
+            )
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result = individual_item_serializer.data,
+                result = paginated_result(list(individual_items), paginator),
             )
             
         except IndividualItem.DoesNotExist:
@@ -351,19 +364,21 @@ class IndividualItemAPIView(APIView):
             )
 
 class SupplierAPIView(APIView):
+    @cached_list('supplier')
     def get(self, request, *args, **kwargs):
         try:
-            #fetching all suppliers, excluding their items
-            suppliers = Supplier.objects.all()
-            supplier_serializer = SupplierSerializer(suppliers, many=True)
-            for supplier_data in supplier_serializer.data:
-                supplier_data.pop('supplieritem_supplier', None)  #excluding items in list view
+            if stream_requested(request):
+                return stream_response(request, Supplier.objects.all(), ['id', 'supplierName', 'address', 'contactNo'])
+
+            #fetching all suppliers, excluding their items (not even loaded, one query per page)
+            supplier_fields = [field for field in SupplierSerializer.Meta.fields if field != 'supplieritem_supplier']
+            suppliers, paginator = paginate_queryset(request, read_values(Supplier.objects.all(), supplier_fields), self)
 
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result=supplier_serializer.data,
+                result=paginated_result(list(suppliers), paginator),
             )
 
         except Exception as e:
@@ -634,19 +649,21 @@ class SupplierItemAPIView(APIView):
             )
 
 class PurchaseAPIView(APIView):
+    @cached_list('purchase')
     def get(self, request, *args, **kwargs):
         try:
-            #fetching all purchase, excluding their items
-            purchase = Purchase.objects.all()
-            purchase_serializer = PurchaseSerializer(purchase, many=True)
-            for supplier_data in purchase_serializer.data:
-                supplier_data.pop('purchaseitem_purchase', None)  #excluding items in list view
+            if stream_requested(request):
+                return stream_response(request, Purchase.objects.all(), ['id', 'billNo', 'supplier', 'totalPrice', 'finalPriceWithVat', 'paymentStatus'])
+
+            #fetching all purchase, excluding their items (not even loaded, one query per page)
+            purchase_fields = [field for field in PurchaseSerializer.Meta.fields if field != 'purchaseitem_purchase']
+            purchase, paginator = paginate_queryset(request, read_values(Purchase.objects.all(), purchase_fields), self)
 
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result=purchase_serializer.data,
+                result=paginated_result(list(purchase), paginator),
             )
             
         except Purchase.DoesNotExist:
@@ -776,6 +793,33 @@ class PurchaseAPIView(APIView):
                 result=None,
             )
         
+class PurchaseBillAPIView(APIView):
+    def post(self, request, *args, **kwargs):
+        try:
+            new_bill_serializer = PurchaseBillSerializer(data=request.data)
+            if new_bill_serializer.is_valid():
+                new_purchase = new_bill_serializer.save()
+                return api_response(
+                    is_success=True,
+                    error_message=None,
+                    status_code=status.HTTP_201_CREATED,
+                    result=PurchaseSerializer(new_purchase).data, #same shape as the purchase endpoints, lines with their ids
+                )
+            return api_response(
+                is_success=False,
+                error_message=new_bill_serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                result=None,
+            )
+
+        except Exception as e:
+            return api_response(
+                is_success=False,
+                error_message="An error occurred while recording the bill. " + str(e),
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                result=None,
+            )
+
 class PurchaseItemAPIView(APIView):
     def get(self, request, *args, **kwargs):
         try:
@@ -791,14 +835,13 @@ class PurchaseItemAPIView(APIView):
 
             #fetching the specific purchase items excluding supplier details
             purchase = get_object_or_404(Purchase, id=purchase_id)
-            purchase_item = purchase.purchaseitem_purchase.all()
-            purchase_item_serializer = PurchaseItemSerializer(purchase_item, many=True)
+            purchase_item = read_values(purchase.purchaseitem_purchase.all(), PurchaseItemSerializer.Meta.fields)
 
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result=purchase_item_serializer.data,
+                result=list(purchase_item),
             )
             
         except PurchaseItem.DoesNotExist:
@@ -928,19 +971,21 @@ class PurchaseItemAPIView(APIView):
             )
 
 class ProjectAPIView(APIView):
+    @cached_list('project')
     def get(self, request, *args, **kwargs):
         try:
-            #fetching all projects, excluding their items
-            projects = Project.objects.all()
-            project_serializer = ProjectSerializer(projects, many=True)
-            for supplier_data in project_serializer.data:
-                supplier_data.pop('project_item_project', None)  #excluding items in list view
+            if stream_requested(request):
+                return stream_response(request, Project.objects.all(), ['id', 'projectName', 'projectLeader'])
+
+            #fetching all projects, excluding their items (not even loaded, one query per page)
+            project_fields = [field for field in ProjectSerializer.Meta.fields if field != 'project_item_project']
+            projects, paginator = paginate_queryset(request, read_values(Project.objects.all(), project_fields), self)
 
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result=project_serializer.data,
+                result=paginated_result(list(projects), paginator),
             )
 
         except Exception as e:
@@ -1075,14 +1120,13 @@ class ProjectItemAPIView(APIView):
 
             #fetching the specific project items excluding project details
             project = get_object_or_404(Project, id=project_item_id)
-            project_item = project.project_item_project.all()
-            project_item_serializer = ProjectItemSerializer(project_item, many=True)
+            project_item = read_values(project.project_item_project.all(), ProjectItemSerializer.Meta.fields)
 
             return api_response(
                 is_success=True,
                 error_message=None,
                 status_code=status.HTTP_200_OK,
-                result=project_item_serializer.data,
+                result=list(project_item),
             )
 
         except Exception as e:
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+#per request counters filled while RequestMetricsMiddleware is handling a request, None everywhere else (shell, commands)
+_request_metrics = ContextVar('request_metrics', default=None)
+
+def new_metrics():
+    return {
+        'queries': 0,
+        'db_time': 0.0,
+        'signal_time': 0.0,
+        'serialization_time': 0.0,
+        'signal_depth': 0, #receivers triggered from inside other receivers are only counted once, by the outermost one
+    }
+
+@contextmanager
+def collecting(metrics):
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+def current_metrics():
+    return _request_metrics.get()
+
+def record_query(execute, sql, params, many, context):
+    #connection.execute_wrapper hook, counts every statement and the time spent waiting for the database
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics['queries'] += 1
+        metrics['db_time'] += perf_counter() - start
+
+def timed_signal(receiver_function):
+    #decorator for signal receivers, adds the time spent in them (including their queries) to the request's signal_time
+    @wraps(receiver_function)
+    def wrapper(*args, **kwargs):
+        metrics = _request_metrics.get()
+        if metrics is None:
+            return receiver_function(*args, **kwargs)
+
+        metrics['signal_depth'] += 1
+        start = perf_counter()
+        try:
+            return receiver_function(*args, **kwargs)
+        finally:
+            metrics['signal_depth'] -= 1
+            if metrics['signal_depth'] == 0:
+                metrics['signal_time'] += perf_counter() - start
+    return wrapper
+
+@contextmanager
+def timed_serialization():
+    metrics = _request_metrics.get()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics['serialization_time'] += perf_counter() - start
@@ -0,0 +1,79 @@
+import json
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+from django.conf import settings
+from django.db import connections
+from inventory_management.metrics import new_metrics, collecting, record_query, timed_serialization
+
+logger = logging.getLogger('inventory_management.metrics')
+
+class QueryBudgetExceeded(AssertionError):
+    #raised instead of only logging when QUERY_BUDGET_STRICT is on (test runs), an AssertionError so test runners report it as a failure
+    pass
+
+class RequestMetricsMiddleware:
+    #records query count, database time, signal receiver time and response rendering time of every request
+    #DEBUG: sent back as X-* response headers, otherwise: one JSON log line per request on the inventory_management.metrics logger
+    #QUERY_BUDGETS maps url names to the maximum number of queries a request to them may run, for all methods or per method
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = perf_counter()
+        with collecting(new_metrics()) as metrics, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            response = self.get_response(request)
+        total_time = perf_counter() - start
+
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        summary = {
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            'queries': metrics['queries'],
+            'db_ms': round(metrics['db_time'] * 1000, 2),
+            'signal_ms': round(metrics['signal_time'] * 1000, 2),
+            'serialization_ms': round(metrics['serialization_time'] * 1000, 2),
+            'total_ms': round(total_time * 1000, 2),
+        }
+
+        if settings.DEBUG:
+            response['X-DB-Queries'] = summary['queries']
+            response['X-DB-Time-Ms'] = summary['db_ms']
+            response['X-Signal-Time-Ms'] = summary['signal_ms']
+            response['X-Serialization-Time-Ms'] = summary['serialization_ms']
+            response['X-Total-Time-Ms'] = summary['total_ms']
+        else:
+            logger.info(json.dumps(summary))
+
+        self.check_budget(summary)
+        return response
+
+    def process_template_response(self, request, response):
+        #DRF responses are rendered (serialized to JSON) after the view returns, timing that step
+        render = response.render
+
+        def timed_render():
+            with timed_serialization():
+                return render()
+
+        response.render = timed_render
+        return response
+
+    def check_budget(self, summary):
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(summary['url_name'])
+        if isinstance(budget, dict):
+            #per method budgets, eg: {'GET': 10, 'POST': 30}
+            budget = budget.get(summary['method'])
+        if budget is None or summary['queries'] <= budget:
+            return
+
+        message = (f"{summary['method']} {summary['path']} ({summary['url_name']}) ran {summary['queries']} queries, "
+                   f"budget is {budget}")
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,34 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError: #optional, without it everything renders through the standard library json module as before
+    orjson = None
+
+#orjson encodes dicts, lists, strings (and their subclasses: ReturnDict, ReturnList, ErrorDetail) and numbers natively in C,
+#everything else (Decimal, lazy translations, uuids...) goes through DRF's encoder like with the stock renderer
+#OPT_NON_STR_KEYS: serializer errors of nested lists are keyed by row index
+#OPT_PASSTHROUGH_DATETIME: dates and times keep DRF's format (milliseconds, Z for utc), streamed .values() rows contain raw ones
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+_default = JSONEncoder().default
+
+def dumps(data):
+    #compact utf-8 json bytes, the same as the stock JSONRenderer's except for NaN and infinite floats: orjson writes them as
+    #null where the stock renderer (STRICT_JSON) raises instead of rendering
+    if orjson is not None:
+        content = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        #escaped like the stock renderer does, they are valid json but end a line inside javascript string literals
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
+    return JSONRenderer().render(data)
+
+class FastJSONRenderer(JSONRenderer):
+    #drop-in replacement of JSONRenderer for the api_response envelopes, indented output (?format=json; indent=4) is left to it
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
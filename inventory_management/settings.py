@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory_management.middleware.RequestMetricsMiddleware', #first, so the queries of every other middleware are counted too
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', #for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -142,13 +143,74 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    #orjson backed json rendering (inventory_management/renderers.py), the browsable api only while developing
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'inventory_management.renderers.FastJSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
     ],
     "EXCEPTION_HANDLER": "inventory_management.exception.custom_exception_handler",
 }
 
+#default and maximum page size for list endpoints when a client asks for cursor pagination (?page_size= / ?cursor=)
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 1000))
+#rows fetched per round trip by the server-side cursor of streamed lists (?stream=ndjson / ?stream=json)
+API_STREAM_CHUNK_SIZE = int(os.getenv('API_STREAM_CHUNK_SIZE', 2000))
+
+#cache for the item, category, supplier and project list responses (inventory/cache.py), local memory by default,
+#a file based cache (CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache, CACHE_LOCATION=/path) is shared by all workers
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'inventory'),
+    },
+}
+#seconds a cached list is kept, writes invalidate it right away through the version counters
+#with the default local memory cache every worker process has its own counters: a write only reaches the other workers through
+#INVENTORY_NOTIFY (postgres), anywhere else they keep serving their cached lists (and their own ETags) for up to this long,
+#so run several workers with INVENTORY_NOTIFY on or a shared CACHE_BACKEND (file based, memcached, redis)
+LIST_CACHE_TIMEOUT = int(os.getenv('LIST_CACHE_TIMEOUT', 300))
+#on postgres, writes publish NOTIFY messages and every worker runs a listener thread evicting its per process caches
+#(local memory list versions, supplier price lists), inventory/notifications.py
+INVENTORY_NOTIFY = os.getenv('INVENTORY_NOTIFY', 'True') == 'True'
+#on postgres, item code blocks are reserved on a separate autocommit connection so a long purchase doesn't hold the counter row
+#until it commits, a rolled back purchase leaves a gap in the codes, ItemCodeCounter.reserve
+ITEM_CODE_AUTOCOMMIT = os.getenv('ITEM_CODE_AUTOCOMMIT', 'True') == 'True'
+
+#maximum number of queries per request for a url name, exceeding it logs a warning (or fails when QUERY_BUDGET_STRICT is on, for test runs)
+#a number applies to every method, a dict sets budgets per method; only the list reads are budgeted, they run a constant number
+#of queries whatever the page size (writes on the same urls run more and are not covered)
+QUERY_BUDGETS = {
+    'items_list': {'GET': 10},
+    'category_list': {'GET': 10},
+    'individual_item_list': {'GET': 10},
+    'supllier_list': {'GET': 10},
+    'purchase_list': {'GET': 10},
+    'project_list': {'GET': 10},
+}
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT') == 'True'
+
+#per request metrics (RequestMetricsMiddleware) are logged as one JSON line per request when DEBUG is off
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'inventory_management.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'inventory.notifications': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
 #timedelta is a class of python datetime module, and is used for performing arithmetics on time/date related variables
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
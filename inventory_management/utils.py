@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework import status
+from inventory_management.renderers import dumps
 
 def api_response(
         is_success=False,
@@ -15,4 +19,66 @@ def api_response(
             "StatusCode": status_code,
             "Result": result
         }
-    )
\ No newline at end of file
+    )
+
+class KeysetPagination(CursorPagination):
+    #keyset pagination on the primary key: every page is an index range scan (WHERE id > last seen id ORDER BY id LIMIT n)
+    #so response time stays flat however deep the client pages, cursors are opaque base64 tokens in the next/previous links
+    #'id' rather than 'pk': pages of .values() rows (read_values) are plain dicts, the cursor reads the position from row['id']
+    ordering = 'id'
+    page_size = getattr(settings, 'API_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+
+    def is_requested(self, request):
+        #opt-in, lists keep returning everything unless the client asks for a page
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+def paginate_queryset(request, queryset, view):
+    #returns (rows, paginator), paginator is None when the client didn't ask for pagination
+    paginator = KeysetPagination()
+    if not paginator.is_requested(request):
+        return queryset, None
+    return paginator.paginate_queryset(queryset, request, view=view), paginator
+
+def paginated_result(data, paginator):
+    #wrapping a page with its cursors, goes inside the usual api_response envelope as Result
+    if paginator is None:
+        return data
+    return {
+        "Results": data,
+        "Next": paginator.get_next_link(),
+        "Previous": paginator.get_previous_link(),
+        "PageSize": paginator.page_size,
+    }
+
+#content types of the streaming modes a client can ask for with ?stream=
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson', #one json object per line
+    'json': 'application/json', #the usual api_response envelope, written out row by row
+}
+
+def stream_requested(request):
+    return request.query_params.get('stream') in STREAM_FORMATS
+
+def stream_response(request, queryset, fields):
+    #reading plain dicts through a server-side cursor and encoding each row as it's produced,
+    #so memory stays flat and the first rows go out before the last ones are read
+    stream_format = request.query_params.get('stream')
+    chunk_size = getattr(settings, 'API_STREAM_CHUNK_SIZE', 2000)
+    rows = queryset.order_by('pk').values(*fields).iterator(chunk_size=chunk_size)
+
+    def ndjson_lines():
+        for row in rows:
+            yield dumps(row) + b"\n"
+
+    def json_envelope():
+        yield b'{"IsSuccess":true,"ErrorMessage":null,"StatusCode":200,"Result":['
+        separator = b""
+        for row in rows:
+            yield separator + dumps(row)
+            separator = b","
+        yield b']}'
+
+    content = ndjson_lines() if stream_format == 'ndjson' else json_envelope()
+    return StreamingHttpResponse(content, content_type=STREAM_FORMATS[stream_format])